@@ -4,6 +4,7 @@ from flask_login import LoginManager
 from flask_cors import CORS
 from flask_socketio import SocketIO
 from dotenv import load_dotenv
+from werkzeug.local import LocalProxy
 import os
 
 load_dotenv()
@@ -25,11 +26,18 @@ def create_app():
     }
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     app.config["SERVICE_TOKEN"] = os.getenv("SERVICE_TOKEN")
+    app.config["SCAN_QUEUE_BACKEND"] = os.getenv("SCAN_QUEUE_BACKEND", "memory")
+    app.config["SCAN_QUEUE_REDIS_URL"] = os.getenv("SCAN_QUEUE_REDIS_URL")
     CORS(app)
 
     db.init_app(app)
 
-    socketio.init_app(app)
+    # Con varios workers las emisiones deben pasar por una cola compartida
+    socketio.init_app(app, message_queue=os.getenv("SOCKETIO_MESSAGE_QUEUE"))
+
+    from .scan_queue import init_scan_queue
+
+    init_scan_queue(app)
 
     from . import sockets
 
@@ -55,18 +63,25 @@ def create_app():
 
     app.register_blueprint(scan_bp)
 
-    from .events import set_active_event_for_request, get_active_event_stats_preview
+    from .commands import register_commands
+
+    register_commands(app)
+
+    from .events import get_active_event_snapshot, get_active_event_stats_preview
+    from .request_globals import LazyRequestGlobals, register_lazy_global
 
-    @app.before_request
-    def inject_active_event():
-        set_active_event_for_request()
-        g.active_event_stats_preview = get_active_event_stats_preview()
+    # Evento activo y resumen de estadísticas sólo se calculan si se leen
+    app.app_ctx_globals_class = LazyRequestGlobals
+    register_lazy_global("active_event", get_active_event_snapshot)
+    register_lazy_global("active_event_stats_preview", get_active_event_stats_preview)
 
     @app.context_processor
     def inject_active_event_into_templates():
         return {
-            "active_event": g.get("active_event"),
-            "active_event_stats_preview_today": g.get("active_event_stats_preview"),
+            "active_event": LocalProxy(lambda: g.active_event),
+            "active_event_stats_preview_today": LocalProxy(
+                lambda: g.active_event_stats_preview
+            ),
         }
 
     return app
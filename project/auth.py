@@ -11,12 +11,31 @@ from flask import (
     g,
     session,
 )
-from datetime import date
+from datetime import date, datetime
 from flask_login import login_user, logout_user, login_required, current_user
 from functools import wraps
+from sqlalchemy import func, literal, select
 
-from .models import User, Stats, Event
-from .events import get_active_event
+from .models import ExhibitorScan, ExhibitorScanTombstone, User, Stats
+from .state import (
+    build_records_channel,
+    invalidate_cached_records,
+    publish_stats_reload,
+)
+from .caching import (
+    build_etag,
+    bump_data_version,
+    bump_records_version,
+    conditional_json,
+    data_version_subquery,
+)
+from .events import rebuild_appointment_counters
+from .statistics import (
+    get_company_reps,
+    get_exhibitor_companies,
+    get_exhibitor_companies_by_event,
+    rebuild_exhibitor_rollups,
+)
 from . import db
 
 auth = Blueprint("auth", __name__)
@@ -37,17 +56,10 @@ def require_user_type(*allowed_types):
 
 
 def _build_event_companies_index():
-    records = (
-        Stats.query.with_entities(Stats.stats, Event.location, Event.year)
-        .join(Event, Event.event_id == Stats.event_id)
-        .all()
-    )
-    index = []
-    for stats_json, location, year in records:
-        companies = stats_json.get("exhibitor_companies", []) if stats_json else []
-        companies_upper = {c.strip().upper() for c in companies}
-        index.append((f"{location} {year}", companies_upper))
-    return index
+    return [
+        (name, {c.strip().upper() for c in companies})
+        for name, companies in get_exhibitor_companies_by_event()
+    ]
 
 
 def _get_sedes_for_company(company, event_companies_index):
@@ -95,18 +107,8 @@ def login_post():
 @login_required
 @require_user_type("EXHIBITOR")
 def select_rep():
-    event = get_active_event()
-    reps = []
-    if event and event.stats_ev and event.stats_ev.stats:
-        exhibitor_list = event.stats_ev.stats.get("exhibitor_scan_stats", [])
-        own_company = (current_user.company or "").strip().upper()
-        reps = sorted(
-            {
-                f'{row.get("Nombre(s)", "").strip()} {row.get("Apellido(s)", "").strip()}'.strip()
-                for row in exhibitor_list
-                if row.get("Empresa", "").strip().upper() == own_company
-            }
-        )
+    event = g.active_event
+    reps = get_company_reps(event.event_id, current_user.company) if event else []
     return render_template("select_rep.html", reps=reps)
 
 
@@ -128,10 +130,7 @@ def select_rep_post():
 @require_user_type("ADMIN")
 def signup():
     active_event = g.active_event
-    stats = Stats.query.filter_by(event_id=active_event.event_id).first()
-    companies = []
-    if stats and stats.stats:
-        companies = stats.stats.get("exhibitor_companies", [])
+    companies = get_exhibitor_companies(active_event.event_id) if active_event else []
     sede_label = (
         f"{active_event.location} {active_event.year}"
         if active_event
@@ -166,6 +165,7 @@ def signup_post():
     )
     new_user.set_password(password)
     db.session.add(new_user)
+    bump_data_version("users")
     db.session.commit()
 
     return jsonify({"success": True, "message": "Usuario registrado exitosamente"}), 200
@@ -190,22 +190,90 @@ def users():
 @login_required
 @require_user_type("ADMIN")
 def users_list():
+    total, max_user_id, max_stats_updated_at, version = db.session.execute(
+        select(
+            func.count(User.user_id),
+            func.max(User.user_id),
+            select(func.max(Stats.updated_at)).scalar_subquery(),
+            data_version_subquery("users"),
+        )
+    ).one()
+    etag = build_etag("users", total, max_user_id, max_stats_updated_at, version)
+    return conditional_json(etag, _build_users_payload)
+
+
+def _build_users_payload():
     users = User.query.all()
     event_companies_index = _build_event_companies_index()
-    return jsonify(
-        [
-            {
-                "id": u.user_id,
-                "name": u.name,
-                "display_name": u.display_name or "",
-                "email": u.email,
-                "company": u.company or "",
-                "user_type": u.user_type,
-                "is_active_user": u.is_active_user,
-                "sedes": _get_sedes_for_company(u.company, event_companies_index),
-            }
-            for u in users
-        ]
+    return [
+        {
+            "id": u.user_id,
+            "name": u.name,
+            "display_name": u.display_name or "",
+            "email": u.email,
+            "company": u.company or "",
+            "user_type": u.user_type,
+            "is_active_user": u.is_active_user,
+            "sedes": _get_sedes_for_company(u.company, event_companies_index),
+        }
+        for u in users
+    ]
+
+
+def _scan_event_ids(user_ids):
+    return (
+        db.session.execute(
+            select(ExhibitorScan.event_id)
+            .where(ExhibitorScan.user_id.in_(user_ids))
+            .distinct()
+        )
+        .scalars()
+        .all()
+    )
+
+
+def _tombstone_user_scans(user_ids):
+    # Los clientes que sincronizan con `since` sólo ven bajas con lápida
+    db.session.execute(
+        ExhibitorScanTombstone.__table__.insert().from_select(
+            ["e_scan_id", "event_id", "company", "deleted_at"],
+            select(
+                ExhibitorScan.e_scan_id,
+                ExhibitorScan.event_id,
+                User.company,
+                literal(datetime.now()),
+            )
+            .join(User, User.user_id == ExhibitorScan.user_id)
+            .where(ExhibitorScan.user_id.in_(user_ids)),
+        )
+    )
+
+
+def _scan_companies(user_ids):
+    return set(
+        db.session.execute(
+            select(User.company, ExhibitorScan.event_id)
+            .join(User, User.user_id == ExhibitorScan.user_id)
+            .where(ExhibitorScan.user_id.in_(user_ids))
+            .distinct()
+        ).all()
+    )
+
+
+def _bump_records_versions(scan_companies):
+    # Las cachés de registros de otros procesos se validan con este contador
+    for company, event_id in scan_companies:
+        bump_records_version(build_records_channel(company, event_id))
+
+
+def _invalidate_records(scan_companies):
+    for event_id in {event_id for _, event_id in scan_companies}:
+        invalidate_cached_records(event_id)
+
+
+def _touch_user_scans(user_ids):
+    ExhibitorScan.query.filter(ExhibitorScan.user_id.in_(user_ids)).update(
+        {ExhibitorScan.updated_at: datetime.now()}, synchronize_session=False
     )
 
 
@@ -220,12 +288,33 @@ def edit_user(user_id):
         )
     data = request.get_json()
     user = User.query.get_or_404(user_id)
+    company_changed = data.get("company", user.company) != user.company
+    # El login del expositor forma parte de cada registro
+    records_changed = company_changed or data.get("name", user.name) != user.name
+    scan_companies = _scan_companies([user_id]) if records_changed else set()
+    if company_changed:
+        # Antes del cambio: las lápidas quedan bajo la empresa anterior
+        _tombstone_user_scans([user_id])
     user.name = data.get("name", user.name)
     user.display_name = data.get("display_name", user.display_name)
     user.email = data.get("email", user.email)
     user.company = data.get("company", user.company)
     user.user_type = data.get("user_type", user.user_type)
+    bump_data_version("users")
+    if records_changed:
+        # Los contactos aparecen como cambios recientes en su empresa
+        _touch_user_scans([user_id])
+        db.session.flush()
+        scan_companies |= _scan_companies([user_id])
+        _bump_records_versions(scan_companies)
+    event_ids = _scan_event_ids([user_id]) if company_changed else []
+    if event_ids:
+        rebuild_exhibitor_rollups(event_ids)
     db.session.commit()
+    _invalidate_records(scan_companies)
+    # Los totales por empresa se recalcularon: la página los vuelve a pedir
+    for event_id in event_ids:
+        publish_stats_reload(event_id)
     return jsonify({"success": True, "message": "Usuario actualizado"})
 
 
@@ -240,8 +329,19 @@ def delete_users():
             jsonify({"success": False, "message": "No puedes eliminarte a ti mismo"}),
             400,
         )
+    event_ids = _scan_event_ids(ids)
+    scan_companies = _scan_companies(ids)
+    _tombstone_user_scans(ids)
     User.query.filter(User.user_id.in_(ids)).delete()
+    bump_data_version("users")
+    _bump_records_versions(scan_companies)
+    rebuild_exhibitor_rollups(event_ids)
+    for event_id in event_ids:
+        rebuild_appointment_counters(event_id)
     db.session.commit()
+    _invalidate_records(scan_companies)
+    for event_id in event_ids:
+        publish_stats_reload(event_id)
     return jsonify({"success": True, "message": f"{len(ids)} usuario(s) eliminado(s)"})
 
 
@@ -260,6 +360,7 @@ def bulk_role():
             400,
         )
     User.query.filter(User.user_id.in_(ids)).update({"user_type": role})
+    bump_data_version("users")
     db.session.commit()
     return jsonify(
         {"success": True, "message": f"Rol actualizado para {len(ids)} usuario(s)"}
@@ -275,6 +376,7 @@ def activate_users():
     User.query.filter(User.user_id.in_(ids)).update(
         {"is_active_user": True}, synchronize_session=False
     )
+    bump_data_version("users")
     db.session.commit()
     return jsonify({"success": True, "message": f"{len(ids)} usuario(s) activado(s)"})
 
@@ -293,6 +395,7 @@ def deactivate_users():
     User.query.filter(User.user_id.in_(ids)).update(
         {"is_active_user": False}, synchronize_session=False
     )
+    bump_data_version("users")
     db.session.commit()
     return jsonify(
         {"success": True, "message": f"{len(ids)} usuario(s) desactivado(s)"}
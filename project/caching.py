@@ -0,0 +1,86 @@
+from datetime import date
+from hashlib import sha1
+
+from flask import request, jsonify, Response
+from sqlalchemy import func, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from .models import DataVersion, ExhibitorScan, ExhibitorScanTombstone, User
+from .state import build_records_channel
+from . import db
+
+
+def bump_data_version(scope: str):
+    # Se ejecuta dentro de la transacción de quien modifica los datos
+    return db.session.execute(
+        pg_insert(DataVersion)
+        .values(scope=scope, version=1)
+        .on_conflict_do_update(
+            index_elements=[DataVersion.scope],
+            set_={"version": DataVersion.version + 1},
+        )
+        .returning(DataVersion.version)
+    ).scalar()
+
+
+def data_version_subquery(scope: str):
+    return (
+        select(func.coalesce(func.max(DataVersion.version), 0))
+        .where(DataVersion.scope == scope)
+        .scalar_subquery()
+    )
+
+
+def records_scope(channel: str):
+    return f"records|{channel}"
+
+
+def bump_records_version(channel):
+    if not channel:
+        return None
+    return bump_data_version(records_scope(channel))
+
+
+def records_version(event_id: int, company=None):
+    tombstones = select(func.max(ExhibitorScanTombstone.deleted_at)).where(
+        ExhibitorScanTombstone.event_id == event_id
+    )
+    if company is not None:
+        tombstones = tombstones.where(ExhibitorScanTombstone.company == company)
+
+    # El contador del canal es el que valida la caché de registros en memoria
+    channel = build_records_channel(company, event_id)
+    stmt = select(
+        func.max(ExhibitorScan.updated_at),
+        func.count(ExhibitorScan.e_scan_id),
+        tombstones.scalar_subquery(),
+        data_version_subquery(records_scope(channel)) if channel else literal(0),
+    ).where(ExhibitorScan.event_id == event_id)
+    if company is not None:
+        stmt = stmt.join(User, User.user_id == ExhibitorScan.user_id).where(
+            User.company == company
+        )
+
+    return tuple(db.session.execute(stmt).one())
+
+
+def records_version_token(event_id: int, company=None, version=None):
+    max_updated_at, total, max_deleted_at, counter = version or records_version(
+        event_id, company
+    )
+    return f"{event_id}|{company}|{max_updated_at}|{total}|{max_deleted_at}|{counter}"
+
+
+def build_etag(*parts):
+    raw = "|".join(str(part) for part in (*parts, date.today()))
+    return sha1(raw.encode("utf-8")).hexdigest()
+
+
+def conditional_json(etag: str, build_payload):
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = jsonify(build_payload())
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
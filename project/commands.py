@@ -0,0 +1,92 @@
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import text
+
+from .events import rebuild_appointment_counters
+from .statistics import STATS_NOTIFY_TRIGGER_SQL, rebuild_exhibitor_rollups
+from .models import Event, ExhibitorScan
+from . import db
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+@click.command("backfill-scan-dedup-keys")
+@with_appcontext
+def backfill_scan_dedup_keys():
+    # Sólo el primer registro de cada contacto recibe la llave; los duplicados
+    # históricos quedan en NULL para no violar el índice único
+    seen = {
+        (user_id, event_id, dedup_key)
+        for user_id, event_id, dedup_key in db.session.query(
+            ExhibitorScan.user_id, ExhibitorScan.event_id, ExhibitorScan.dedup_key
+        ).filter(ExhibitorScan.dedup_key.isnot(None))
+    }
+    updated = 0
+    last_id = 0
+    while True:
+        rows = (
+            ExhibitorScan.query.filter(
+                ExhibitorScan.dedup_key.is_(None), ExhibitorScan.e_scan_id > last_id
+            )
+            .order_by(ExhibitorScan.e_scan_id.asc())
+            .limit(BACKFILL_BATCH_SIZE)
+            .all()
+        )
+        if not rows:
+            break
+        for row in rows:
+            last_id = row.e_scan_id
+            dedup_key = ExhibitorScan.build_dedup_key(
+                row.scanned_a_last_name,
+                row.scanned_a_name,
+                row.scanned_a_email,
+                row.scanned_a_company,
+            )
+            identity = (row.user_id, row.event_id, dedup_key)
+            if identity in seen:
+                continue
+            seen.add(identity)
+            row.dedup_key = dedup_key
+            updated += 1
+        db.session.commit()
+    click.echo(f"{updated} registros actualizados")
+
+
+@click.command("rebuild-appointment-counters")
+@click.option("--event-id", type=int, default=None)
+@with_appcontext
+def rebuild_appointment_counters_command(event_id):
+    # Recalcula los contadores por día desde las citas existentes
+    if event_id is not None and not db.session.get(Event, event_id):
+        raise click.BadParameter(f"No existe la sede {event_id}")
+    rows = rebuild_appointment_counters(event_id)
+    db.session.commit()
+    click.echo(f"{rows} días recalculados")
+
+
+@click.command("rebuild-exhibitor-rollups")
+@click.option("--event-id", type=int, default=None)
+@with_appcontext
+def rebuild_exhibitor_rollups_command(event_id):
+    # Recalcula los totales por empresa desde los contactos y citas existentes
+    if event_id is not None and not db.session.get(Event, event_id):
+        raise click.BadParameter(f"No existe la sede {event_id}")
+    rows = rebuild_exhibitor_rollups([event_id] if event_id is not None else None)
+    db.session.commit()
+    click.echo(f"{rows} empresas recalculadas")
+
+
+@click.command("install-stats-notify-trigger")
+@with_appcontext
+def install_stats_notify_trigger():
+    # Avisa a los workers cuando otro proceso reescribe las estadísticas
+    db.session.execute(text(STATS_NOTIFY_TRIGGER_SQL))
+    db.session.commit()
+    click.echo("Trigger de estadísticas instalado")
+
+
+def register_commands(app):
+    app.cli.add_command(backfill_scan_dedup_keys)
+    app.cli.add_command(rebuild_appointment_counters_command)
+    app.cli.add_command(rebuild_exhibitor_rollups_command)
+    app.cli.add_command(install_stats_notify_trigger)
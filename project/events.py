@@ -1,12 +1,28 @@
+from dataclasses import dataclass
 from datetime import date, datetime, timedelta
+from typing import Optional
 from zoneinfo import ZoneInfo
-from flask import g
-from .models import Event, Stats, Appointment, ExhibitorScan
-
-_active_event_cache = (None, None)
-
-_active_event_stats_preview_cache = (None, None, None, None)
-_STATS_PREVIEW_TTL_MINUTES = 20
+import logging
+import os
+import select
+import time
+import psycopg2
+from flask import current_app, g
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from .models import Event, EventDayCounter, Stats, Appointment, ExhibitorScan
+from .caching import data_version_subquery
+from .statistics import DailyStatsSummary, daily_summary_columns
+from . import db, socketio
+
+ACTIVE_EVENT_NOTIFY_CHANNEL = "active_event"
+# Red de seguridad si el LISTEN se cae: cada cuánto se revisa la versión en BD
+ACTIVE_EVENT_REVALIDATE_SECONDS = int(os.getenv("ACTIVE_EVENT_REVALIDATE_SECONDS", 30))
+
+logger = logging.getLogger(__name__)
+
+_active_event_cache = (None, None, 0.0, None)
+_active_event_listener_started = False
 
 EVENT_ZONES = {
     "Colombia": "America/Bogota",
@@ -44,9 +60,135 @@ def get_active_event():
     )
 
 
+@dataclass(frozen=True)
+class ActiveEventSnapshot:
+    event_id: int
+    location: str
+    year: int
+    start_date: date
+    end_date: date
+    manual_status: Optional[bool]
+
+    @classmethod
+    def from_event(cls, event: Event):
+        return cls(
+            event_id=event.event_id,
+            location=event.location,
+            year=event.year,
+            start_date=event.start_date,
+            end_date=event.end_date,
+            manual_status=event.manual_status,
+        )
+
+
 def invalidate_active_event_cache():
     global _active_event_cache
-    _active_event_cache = (None, None)
+    _active_event_cache = (None, None, 0.0, None)
+
+
+def notify_active_event_changed():
+    # Se ejecuta dentro de la transacción del cambio: Postgres entrega el
+    # NOTIFY a los demás workers sólo si se hace commit
+    db.session.execute(
+        text("SELECT pg_notify(:channel, '')"),
+        {"channel": ACTIVE_EVENT_NOTIFY_CHANNEL},
+    )
+
+
+def _events_version():
+    return tuple(
+        db.session.execute(
+            db.select(
+                data_version_subquery("events"),
+                func.count(Event.event_id),
+                func.max(Event.event_id),
+            )
+        ).one()
+    )
+
+
+def open_listen_connection(*channels):
+    # Conexión propia fuera del pool: el LISTEN queda abierto indefinidamente y
+    # no debe ocupar ni devolver al pool una conexión de las peticiones
+    cargs, cparams = db.engine.dialect.create_connect_args(db.engine.url)
+    connection = psycopg2.connect(*cargs, **cparams)
+    try:
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            for channel in channels:
+                cursor.execute(f"LISTEN {channel}")
+    except Exception:
+        connection.close()
+        raise
+    return connection
+
+
+def wait_for_notifies(connection, timeout):
+    if not select.select([connection], [], [], timeout)[0]:
+        return []
+    connection.poll()
+    notifies = list(connection.notifies)
+    connection.notifies.clear()
+    return notifies
+
+
+def _listen_for_active_event_changes(app):
+    while True:
+        try:
+            with app.app_context():
+                connection = open_listen_connection(ACTIVE_EVENT_NOTIFY_CHANNEL)
+            try:
+                # Pudo haber cambios mientras no se escuchaba
+                invalidate_active_event_cache()
+                while True:
+                    if wait_for_notifies(connection, 60):
+                        invalidate_active_event_cache()
+            finally:
+                connection.close()
+        except Exception:
+            logger.exception("Se perdió el LISTEN de %s", ACTIVE_EVENT_NOTIFY_CHANNEL)
+        socketio.sleep(5)
+
+
+def _start_active_event_listener():
+    global _active_event_listener_started
+    if _active_event_listener_started:
+        return
+    _active_event_listener_started = True
+    if db.engine.dialect.name == "postgresql":
+        socketio.start_background_task(
+            _listen_for_active_event_changes, current_app._get_current_object()
+        )
+
+
+def get_active_event_snapshot():
+    global _active_event_cache
+    _start_active_event_listener()
+    today = date.today()
+    now = time.monotonic()
+    cached_date, cached_version, checked_at, snapshot = _active_event_cache
+
+    if cached_date == today and now - checked_at < ACTIVE_EVENT_REVALIDATE_SECONDS:
+        return snapshot
+
+    version = _events_version()
+    if cached_date != today or cached_version != version:
+        event = get_active_event()
+        snapshot = ActiveEventSnapshot.from_event(event) if event else None
+    _active_event_cache = (today, version, now, snapshot)
+    return snapshot
+
+
+def active_event_cache_stats():
+    cached_date, cached_version, checked_at, snapshot = _active_event_cache
+    return {
+        "event_id": snapshot.event_id if snapshot else None,
+        "date": cached_date.isoformat() if cached_date else None,
+        "checked_seconds_ago": (
+            round(time.monotonic() - checked_at, 1) if cached_date else None
+        ),
+        "listener_started": _active_event_listener_started,
+    }
 
 
 def is_exhibitor_edit_window(event):
@@ -57,26 +199,79 @@ def is_exhibitor_edit_window(event):
     return day_number in (3, 4)
 
 
-def set_active_event_for_request():
-    global _active_event_cache
-    today = date.today()
-    cached_date, cached_event_id = _active_event_cache
+def _appointment_counter_deltas(before, after):
+    # `before` y `after` son (fecha, estado) de la cita o None
+    deltas = {}
+    for state, sign in ((before, -1), (after, 1)):
+        if state is None:
+            continue
+        day, status = state
+        scheduled, completed = deltas.get(day, (0, 0))
+        deltas[day] = (scheduled + sign, completed + sign * (status is True))
+    return deltas
+
+
+def bump_appointment_counters(event_id: int, before=None, after=None):
+    # Se ejecuta dentro de la transacción que crea o modifica la cita; regresa
+    # el cambio neto (citas, completadas) para publicarlo tras el commit
+    deltas = _appointment_counter_deltas(before, after)
+    for day, (scheduled, completed) in deltas.items():
+        if not scheduled and not completed:
+            continue
+        stmt = pg_insert(EventDayCounter).values(
+            event_id=event_id,
+            day=day,
+            appointments_scheduled=scheduled,
+            appointments_completed=completed,
+        )
+        db.session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[EventDayCounter.event_id, EventDayCounter.day],
+                set_={
+                    "appointments_scheduled": EventDayCounter.appointments_scheduled
+                    + stmt.excluded.appointments_scheduled,
+                    "appointments_completed": EventDayCounter.appointments_completed
+                    + stmt.excluded.appointments_completed,
+                },
+            )
+        )
+    return (
+        sum(scheduled for scheduled, _ in deltas.values()),
+        sum(completed for _, completed in deltas.values()),
+    )
 
-    if cached_date == today and cached_event_id is not None:
-        g.active_event = Event.query.get(cached_event_id)
-        return
-    if cached_date == today and cached_event_id is None:
-        g.active_event = None
-        return
 
-    event = get_active_event()
-    g.active_event = event
-    _active_event_cache = (today, event.event_id if event else None)
+def rebuild_appointment_counters(event_id=None):
+    delete = db.delete(EventDayCounter)
+    counts = (
+        db.select(
+            ExhibitorScan.event_id,
+            Appointment.date,
+            func.count(Appointment.appointment_id),
+            func.count(Appointment.appointment_id).filter(Appointment.status.is_(True)),
+        )
+        .join(ExhibitorScan, ExhibitorScan.e_scan_id == Appointment.e_scan_id)
+        .group_by(ExhibitorScan.event_id, Appointment.date)
+    )
+    if event_id is not None:
+        delete = delete.where(EventDayCounter.event_id == event_id)
+        counts = counts.where(ExhibitorScan.event_id == event_id)
+
+    db.session.execute(delete)
+    return db.session.execute(
+        db.insert(EventDayCounter).from_select(
+            [
+                "event_id",
+                "day",
+                "appointments_scheduled",
+                "appointments_completed",
+            ],
+            counts,
+        )
+    ).rowcount
 
 
 def get_active_event_stats_preview():
-    global _active_event_stats_preview_cache
-
     active_event = g.get("active_event")
     if not active_event:
         return None
@@ -90,81 +285,44 @@ def get_active_event_stats_preview():
 
     day_key = f"day_{day_number}"
 
-    cached_event_id, cached_day_key, cached_expires_at, cached_payload = (
-        _active_event_stats_preview_cache
-    )
-    if (
-        cached_event_id == active_event.event_id
-        and cached_day_key == day_key
-        and cached_expires_at is not None
-        and today < cached_expires_at
-    ):
-        return cached_payload
-
-    stats_row = (
-        Stats.query.filter(Stats.event_id == active_event.event_id)
-        .order_by(Stats.updated_at.desc())
-        .first()
-    )
-
-    if not stats_row or not stats_row.stats:
-        payload = None
-    else:
-        stats = stats_row.stats
-
-        daily_stats = stats.get("daily_stats", {})
-        daily_types = stats.get("daily_attendee_type_scans", {})
-        daily_scanned_sh = stats.get("daily_scanned_sh", {})
-
-        total = len(daily_stats.get(day_key, {}).get("actual", []))
-        type_stats = daily_types.get(day_key, {})
-
-        daily_exhibitor_stats = stats.get("daily_exhibitor_stats", {})
-        daily_speaker_stats = stats.get("daily_speaker_stats", {})
-        today_str = today.date().isoformat()
-        appointments_scheduled = (
-            Appointment.query.join(ExhibitorScan)
-            .filter(
-                ExhibitorScan.event_id == active_event.event_id,
-                Appointment.date == today_str,
-            )
-            .count()
+    # Una sola consulta: los contadores de citas se mantienen al escribir y del
+    # JSONB de estadísticas sólo se extraen los valores del día
+    row = db.session.execute(
+        db.select(
+            *daily_summary_columns(day_key),
+            func.coalesce(EventDayCounter.appointments_scheduled, 0),
+            func.coalesce(EventDayCounter.appointments_completed, 0),
         )
-        appointments_completed = (
-            Appointment.query.join(ExhibitorScan)
-            .filter(
-                ExhibitorScan.event_id == active_event.event_id,
-                Appointment.date == today_str,
-                Appointment.status.is_(True),
-            )
-            .count()
+        .outerjoin(
+            EventDayCounter,
+            (EventDayCounter.event_id == Stats.event_id)
+            & (EventDayCounter.day == today.date().isoformat()),
         )
+        .where(Stats.event_id == active_event.event_id, Stats.stats.isnot(None))
+        .order_by(Stats.updated_at.desc())
+        .limit(1)
+    ).first()
 
-        payload = {
-            "event_id": active_event.event_id,
-            "day": day_number,
-            "total": total,
-            "combo": type_stats.get("combo", 0),
-            "courses": type_stats.get("courses", 0),
-            "sessions": type_stats.get("sessions", 0),
-            "general": type_stats.get("general", 0),
-            "scholarships": daily_scanned_sh.get(day_key, 0),
-            "exhibitors": daily_exhibitor_stats.get(day_key, {}).get("actual", "---"),
-            "appointments_scheduled": appointments_scheduled,
-            "appointments_completed": appointments_completed,
-            "speakers": daily_speaker_stats.get(day_key, {}).get("actual", 0),
-            "updated_at": (
-                stats_row.updated_at.date().isoformat()
-                if stats_row.updated_at
-                else None
-            ),
-        }
-
-    _active_event_stats_preview_cache = (
-        active_event.event_id,
-        day_key,
-        today + timedelta(minutes=_STATS_PREVIEW_TTL_MINUTES),
-        payload,
-    )
+    if row is None:
+        return None
 
-    return payload
+    *summary_row, appointments_scheduled, appointments_completed = row
+    summary = DailyStatsSummary.from_row(summary_row)
+
+    return {
+        "event_id": active_event.event_id,
+        "day": day_number,
+        "total": summary.total,
+        "combo": summary.attendee_types.get("combo", 0),
+        "courses": summary.attendee_types.get("courses", 0),
+        "sessions": summary.attendee_types.get("sessions", 0),
+        "general": summary.attendee_types.get("general", 0),
+        "scholarships": summary.scholarships,
+        "exhibitors": summary.exhibitors,
+        "appointments_scheduled": appointments_scheduled,
+        "appointments_completed": appointments_completed,
+        "speakers": summary.speakers,
+        "updated_at": (
+            summary.updated_at.date().isoformat() if summary.updated_at else None
+        ),
+    }
@@ -1,20 +1,52 @@
-import pandas as pd
-import io
+import tempfile
+from xlsxwriter.utility import xl_range
 from xlsxwriter.worksheet import Worksheet
 from xlsxwriter.workbook import Workbook
 
-def create_records_excel_file(data:list, edition:str):
-    df = pd.DataFrame(data)
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        startrow = 3
+TITLE = 'Congreso de Mantenimiento y Confiabilidad'
+TABLE_STYLE = 'Table Style Dark 9'
+FIXED_WIDTH_COLUMNS = {'NOTAS': 50, 'REAGENDADA': 15}
 
-        df.to_excel(writer, header=False, index=False, sheet_name='Contactos', startrow=startrow+1)
-        workbook:Workbook = writer.book
-        worksheet:Worksheet = writer.sheets['Contactos']
-        max_row, max_col = df.shape
+def _add_table_after_rows(worksheet:Worksheet, first_row:int, last_row:int, columns:list):
+    # Único punto que toca el estado interno de xlsxwriter. add_table() se
+    # niega a correr con constant_memory, aunque la tabla sólo define rango,
+    # estilo y encabezados (ya escritos en la hoja):
+    # - se apaga constant_memory sólo durante la llamada. Los encabezados que
+    #   add_table() deja en memoria se descartan al cerrar, porque esa fila
+    #   ya se volcó al archivo temporal
+    # - add_table() registra cada celda del rango para detectar traslapes; se
+    #   declara sobre dos filas y después se amplía el rango al real, así el
+    #   rango se calcula de las filas escritas y no de un conteo previo
+    last_col = len(columns) - 1
+    worksheet.constant_memory = False
+    try:
+        worksheet.add_table(first_row, 0, first_row + 1, last_col, {
+            'columns': [{'header': header} for header in columns],
+            'style': TABLE_STYLE,
+        })
+    finally:
+        worksheet.constant_memory = True
+
+    table = worksheet.tables[-1]
+    table['range'] = table['a_range'] = table['autofilter'] = xl_range(first_row, 0, last_row, last_col)
+
+class RecordsExcelWriter:
+    # Escribe un libro fila por fila en `output` (ruta o archivo; por omisión
+    # uno temporal) sin retener el conjunto completo en memoria. Con
+    # constant_memory cada fila se vuelca al pasar a la siguiente: el formato
+    # de cada columna se fija antes de la primera fila y al cerrar sólo se
+    # ajusta el ancho al valor más largo
+    startrow = 3
 
-        title_format = workbook.add_format({
+    def __init__(self, edition:str, columns, output=None):
+        self.output = output if output is not None else tempfile.TemporaryFile()
+        self.workbook = Workbook(self.output, {'constant_memory': True})
+        self.worksheet:Worksheet = self.workbook.add_worksheet('Contactos')
+        self.columns = list(columns)
+        self.widths = [len(str(col)) for col in self.columns]
+        self.row_num = self.startrow
+
+        title_format = self.workbook.add_format({
             'bold': True,
             'font_size': 20,
             'align': 'center',
@@ -22,7 +54,7 @@ def create_records_excel_file(data:list, edition:str):
             'bg_color': '#daeef3'
         })
 
-        subtitle_format = workbook.add_format({
+        subtitle_format = self.workbook.add_format({
             'bold': True,
             'italic': True,
             'font_size': 14,
@@ -30,25 +62,48 @@ def create_records_excel_file(data:list, edition:str):
             'valign': 'vcenter',
         })
 
-        worksheet.merge_range("A1:E1", "Congreso de Mantenimiento y Confiabilidad", title_format)
-        worksheet.set_row(0,25)
-        worksheet.write("C2", edition, subtitle_format)
+        wrap_format = self.workbook.add_format({'text_wrap':True, 'valign': 'vcenter'})
+        column_format = self.workbook.add_format({'valign': 'vcenter'})
+        self.column_formats = [
+            wrap_format if col in FIXED_WIDTH_COLUMNS else column_format
+            for col in self.columns
+        ]
+        self._set_columns()
+
+        self.worksheet.merge_range("A1:E1", TITLE, title_format)
+        self.worksheet.set_row(0,25)
+        self.worksheet.write("C2", edition, subtitle_format)
+        self.worksheet.write_row(self.startrow, 0, self.columns)
 
-        column_settings = []
-        for header in df.columns:
-            column_settings.append({'header': header})
+    def _set_columns(self):
+        for i, col in enumerate(self.columns):
+            width = FIXED_WIDTH_COLUMNS.get(col, self.widths[i] + 2)
+            self.worksheet.set_column(i, i, width, self.column_formats[i])
 
-        worksheet.add_table(startrow,0,startrow + max_row, max_col-1, {'columns': column_settings, 'style': 'Table Style Dark 9'})
-        wrap_format = workbook.add_format({'text_wrap':True, 'valign': 'vcenter'})
+    def write(self, record:dict):
+        self.row_num += 1
+        values = [record.get(col) for col in self.columns]
+        self.worksheet.write_row(self.row_num, 0, values)
+        for i, value in enumerate(values):
+            if value is not None:
+                self.widths[i] = max(self.widths[i], len(str(value)))
 
-        for i, col in enumerate(df.columns):
-            if col == 'NOTAS':
-                worksheet.set_column(i,i,50, wrap_format)
-            elif col == 'REAGENDADA':
-                worksheet.set_column(i,i,15, wrap_format)
-            else:
-                col_width = max(len(str(col)), df[col].astype(str).map(len).max())
-                worksheet.set_column(i, i, col_width + 2, workbook.add_format({'valign': 'vcenter'}))
+    def close(self):
+        # Los anchos se escriben al cerrar; el formato de cada columna es el
+        # mismo objeto que ya recibieron las filas volcadas
+        self._set_columns()
+        if self.row_num > self.startrow:
+            # Sin filas la hoja queda sólo con encabezados: add_table() pisaría
+            # la fila que aún no se vuelca
+            _add_table_after_rows(self.worksheet, self.startrow, self.row_num, self.columns)
+        self.workbook.close()
+        if hasattr(self.output, 'seek'):
+            self.output.seek(0)
+        return self.output
 
-    output.seek(0)
-    return output
\ No newline at end of file
+def create_records_excel_file(data, columns, edition:str, output=None):
+    # `data` puede ser cualquier iterable de dicts
+    writer = RecordsExcelWriter(edition, columns, output)
+    for record in data:
+        writer.write(record)
+    return writer.close()
@@ -0,0 +1,448 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+import zipfile
+from datetime import datetime, timedelta
+from threading import Lock
+from uuid import uuid4
+
+from flask import current_app
+from sqlalchemy import and_, case, func, select
+
+from . import db, socketio
+from .caching import records_version, records_version_token
+from .events import event_tz
+from .excel_writer import RecordsExcelWriter, create_records_excel_file
+from .models import Appointment, Event, ExhibitorScan, User
+from .records import (
+    ADMIN_EXPORT_COLUMNS,
+    EXPORT_COLUMNS,
+    select_records,
+    serialize_admin_export_record,
+    serialize_export_record,
+)
+from .tabular_writer import (
+    create_records_csv_file,
+    create_records_parquet_file,
+    iter_records_csv,
+)
+from .state import ExpiringLRUDict
+
+EXPORTS_DIR = os.getenv(
+    "EXPORTS_DIR", os.path.join(tempfile.gettempdir(), "cmc_exports")
+)
+EXPORT_BATCH_SIZE = 1000
+EXPORT_PROGRESS_EVERY = 500
+EXPORT_ZIP_CHUNK_SIZE = 64 * 1024
+EXPORT_JOBS_TTL_SECONDS = 60 * 60
+EXPORT_JOBS_MAX_ENTRIES = 500
+# Un archivo recién escrito no se poda: puede estar a punto de descargarse
+EXPORT_PRUNE_GRACE_SECONDS = 5 * 60
+APPOINTMENT_DATE_PATTERN = r"^\d{4}-\d{2}-\d{2}$"
+APPOINTMENT_HOUR_PATTERN = r"^\d{1,2}:\d{2}$"
+APPOINTMENT_STARTS_AT = "%Y-%m-%d %H:%M"
+EXCEL_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+EXPORT_MIMETYPES = {
+    "xlsx": EXCEL_MIMETYPE,
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+logger = logging.getLogger(__name__)
+
+# Trabajos en curso de este proceso; los terminados viven en EXPORTS_DIR
+export_jobs = ExpiringLRUDict(EXPORT_JOBS_TTL_SECONDS, EXPORT_JOBS_MAX_ENTRIES)
+export_jobs_lock = Lock()
+
+
+def build_export_scope(kind: str, event: Event, company=None, fmt="xlsx"):
+    return {
+        "kind": kind,
+        "event_id": event.event_id,
+        "company": company if kind == "exhibitor" else None,
+        "format": fmt,
+    }
+
+
+def export_filename(scope: dict, event: Event):
+    _, filename = _export_labels(scope, event)
+    # El xlsx conserva el nombre de siempre; el navegador completa la extensión
+    if scope["format"] != "xlsx":
+        filename = f"{filename}.{scope['format']}"
+    return filename
+
+
+def _export_labels(scope: dict, event: Event):
+    if scope["kind"] == "admin":
+        return (
+            f"{event.location} {event.year} - Todas las Marcas",
+            f"Contactos CMC Consolidado {event.location} {event.year}",
+        )
+    return (
+        f"{event.location} {event.year}",
+        f"Contactos CMC {event.location} {event.year}",
+    )
+
+
+def _export_select(scope: dict):
+    if scope["kind"] == "admin":
+        return select_records(scope["event_id"])
+    return select_records(scope["event_id"], scope["company"])
+
+
+def _export_rows(scope: dict):
+    if scope["kind"] == "admin":
+        stmt = _export_select(scope).order_by(
+            User.company.asc(), ExhibitorScan.created_at.asc()
+        )
+        serialize = serialize_admin_export_record
+    else:
+        stmt = _export_select(scope).order_by(ExhibitorScan.created_at.asc())
+        serialize = serialize_export_record
+    # El estado de las citas se calcula en la zona del evento exportado
+    tz = event_tz(db.session.get(Event, scope["event_id"]))
+    rows = db.session.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    return (serialize(row, tz) for row in rows)
+
+
+def _export_columns(scope: dict):
+    return ADMIN_EXPORT_COLUMNS if scope["kind"] == "admin" else EXPORT_COLUMNS
+
+
+def stream_export_csv(scope: dict):
+    return iter_records_csv(_export_rows(scope), _export_columns(scope))
+
+
+def _write_export(scope: dict, records, edition: str, path: str):
+    if scope["format"] == "csv":
+        return create_records_csv_file(records, _export_columns(scope), path)
+    if scope["format"] == "parquet":
+        return create_records_parquet_file(records, _export_columns(scope), path)
+    return create_records_excel_file(records, _export_columns(scope), edition, path)
+
+
+def _appointment_transitions(scope: dict):
+    # El estado de cada cita cambia con la hora: se cuentan las que ya
+    # empezaron y las que ya vencieron para invalidar el archivo al cruzarlas
+    # Misma zona que las etiquetas del archivo: la del evento exportado
+    event = db.session.get(Event, scope["event_id"])
+    now = datetime.now(tz=event_tz(event)).replace(tzinfo=None)
+    # Sin cast: una fecha u hora mal capturada no debe romper la exportación.
+    # Con el formato validado, el orden del texto es el cronológico
+    starts_at = case(
+        (
+            and_(
+                Appointment.date.regexp_match(APPOINTMENT_DATE_PATTERN),
+                Appointment.hour.regexp_match(APPOINTMENT_HOUR_PATTERN),
+            ),
+            Appointment.date + " " + func.lpad(Appointment.hour, 5, "0"),
+        )
+    )
+    stmt = (
+        select(
+            func.count().filter(starts_at <= now.strftime(APPOINTMENT_STARTS_AT)),
+            func.count().filter(
+                starts_at <= (now - timedelta(hours=2)).strftime(APPOINTMENT_STARTS_AT)
+            ),
+        )
+        .select_from(Appointment)
+        .join(ExhibitorScan, ExhibitorScan.e_scan_id == Appointment.e_scan_id)
+        .where(ExhibitorScan.event_id == scope["event_id"])
+    )
+    if scope["company"] is not None:
+        stmt = stmt.join(User, User.user_id == ExhibitorScan.user_id).where(
+            User.company == scope["company"]
+        )
+    started, finished = db.session.execute(stmt).one()
+    return f"{started}|{finished}"
+
+
+def _scope_key(scope: dict):
+    raw = json.dumps(scope, sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def _export_job_id(scope: dict):
+    version = records_version(scope["event_id"], scope["company"])
+    token = "|".join(
+        (
+            records_version_token(scope["event_id"], scope["company"], version),
+            _appointment_transitions(scope),
+        )
+    )
+    digest = hashlib.sha1(token.encode("utf-8")).hexdigest()[:16]
+    return f"{_scope_key(scope)}-{digest}-{scope['format']}", version[1]
+
+
+def artifact_path(job_id: str):
+    fmt = job_id.rsplit("-", 1)[-1]
+    return os.path.join(EXPORTS_DIR, f"{job_id}.{fmt}")
+
+
+def _meta_path(job_id: str):
+    return os.path.join(EXPORTS_DIR, f"{job_id}.json")
+
+
+def read_export_meta(job_id: str):
+    # El id sale de la URL: sólo se aceptan ids con la forma que generamos
+    parts = job_id.split("-")
+    if len(parts) != 3 or not all(part.isalnum() for part in parts):
+        return None
+    if parts[2] not in EXPORT_MIMETYPES:
+        return None
+    if not os.path.exists(artifact_path(job_id)):
+        return None
+    try:
+        with open(_meta_path(job_id), encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def can_access_export(meta: dict, user):
+    if user.user_type == "ADMIN":
+        return True
+    return meta.get("kind") == "exhibitor" and meta.get("company") == user.company
+
+
+def open_export_artifact(job_id: str):
+    # Las descargas envían el archivo ya abierto: si otra exportación lo poda
+    # después, el descriptor sigue siendo legible hasta terminar
+    try:
+        return open(artifact_path(job_id), "rb")
+    except OSError:
+        return None
+
+
+def _prune_stale_artifacts(job_id: str):
+    scope_prefix = job_id.split("-", 1)[0]
+    cutoff = time.time() - EXPORT_PRUNE_GRACE_SECONDS
+    for name in os.listdir(EXPORTS_DIR):
+        if name.endswith(".tmp") or name.startswith(job_id):
+            continue
+        if name.startswith(f"{scope_prefix}-"):
+            path = os.path.join(EXPORTS_DIR, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+def _build_artifact(job_id: str, scope: dict, event: Event, on_progress=None):
+    edition, _ = _export_labels(scope, event)
+    filename = export_filename(scope, event)
+    os.makedirs(EXPORTS_DIR, exist_ok=True)
+    tmp_path = f"{artifact_path(job_id)}.{uuid4().hex}.tmp"
+
+    def tracked(records):
+        for processed, record in enumerate(records, 1):
+            yield record
+            if on_progress and processed % EXPORT_PROGRESS_EVERY == 0:
+                on_progress(processed)
+
+    try:
+        _write_export(scope, tracked(_export_rows(scope)), edition, tmp_path)
+        with open(_meta_path(job_id), "w", encoding="utf-8") as fh:
+            json.dump({**scope, "filename": filename}, fh)
+        os.replace(tmp_path, artifact_path(job_id))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    _prune_stale_artifacts(job_id)
+    return {**scope, "filename": filename}
+
+
+def ensure_export_artifact(scope: dict, event: Event):
+    job_id, _ = _export_job_id(scope)
+    meta = read_export_meta(job_id)
+    artifact = open_export_artifact(job_id) if meta is not None else None
+    if artifact is None:
+        meta = _build_artifact(job_id, scope, event)
+        artifact = open(artifact_path(job_id), "rb")
+    return artifact, meta
+
+
+def _public_job(job: dict):
+    return {key: value for key, value in job.items() if key not in ("rooms", "scope")}
+
+
+def _update_job(job_id: str, **changes):
+    with export_jobs_lock:
+        job = export_jobs.get(job_id)
+        if job is None:
+            return
+        job.update(changes)
+        payload = _public_job(job)
+        rooms = list(job["rooms"])
+        if job["status"] == "ready":
+            export_jobs.pop(job_id, None)
+    for room in rooms:
+        try:
+            socketio.emit("export_progress", payload, room=room)
+        except Exception:
+            logger.exception("No se pudo notificar el avance de %s", job_id)
+
+
+def _run_export_job(app, job_id: str, scope: dict):
+    with app.app_context():
+        try:
+            event = db.session.get(Event, scope["event_id"])
+            _update_job(job_id, status="running")
+            _build_artifact(
+                job_id,
+                scope,
+                event,
+                on_progress=lambda processed: _update_job(job_id, processed=processed),
+            )
+            with export_jobs_lock:
+                total = (export_jobs.get(job_id) or {}).get("total")
+            _update_job(job_id, status="ready", processed=total)
+        except Exception:
+            logger.exception("Falló la exportación %s", job_id)
+            _update_job(job_id, status="error", error="No se pudo generar el archivo")
+        finally:
+            db.session.remove()
+
+
+def submit_export(scope: dict, room=None):
+    job_id, total = _export_job_id(scope)
+    start_job = False
+    with export_jobs_lock:
+        job = export_jobs.get(job_id)
+        if job is None or job["status"] == "error":
+            meta = read_export_meta(job_id)
+            if meta is not None:
+                return {
+                    "job_id": job_id,
+                    "status": "ready",
+                    "processed": total,
+                    "total": total,
+                    "filename": meta["filename"],
+                }
+            job = {
+                "job_id": job_id,
+                "status": "queued",
+                "processed": 0,
+                "total": total,
+                "rooms": set(),
+                "scope": scope,
+            }
+            export_jobs[job_id] = job
+            start_job = True
+        if room:
+            job["rooms"].add(room)
+        payload = _public_job(job)
+
+    if start_job:
+        socketio.start_background_task(
+            _run_export_job, current_app._get_current_object(), job_id, scope
+        )
+    return payload
+
+
+def get_export_status(job_id: str):
+    with export_jobs_lock:
+        job = export_jobs.get(job_id)
+        if job is not None:
+            return _public_job(job), job["scope"]
+    meta = read_export_meta(job_id)
+    if meta is None:
+        return None, None
+    return {"job_id": job_id, "status": "ready", "filename": meta["filename"]}, meta
+
+
+class _ZipStream(io.RawIOBase):
+    # Destino no buscable para ZipFile: acumula lo escrito hasta drenarlo
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _zip_member_name(name: str, taken):
+    # El nombre viene de la empresa: sin separadores de ruta, ".." ni
+    # caracteres inválidos en Windows, y con sufijo si ya existe en el zip
+    base = re.sub(r'[\x00-\x1f\\/:*?"<>|]+', "_", name)
+    base = re.sub(r"\.{2,}", "_", base).strip(" .") or "Contactos"
+    taken = {member.lower() for member in taken}
+    candidate = f"{base}.xlsx"
+    suffix = 2
+    while candidate.lower() in taken:
+        candidate = f"{base} ({suffix}).xlsx"
+        suffix += 1
+    return candidate
+
+
+def _add_workbook_to_zip(archive, stream, writer, name: str):
+    workbook = writer.close()
+    with archive.open(_zip_member_name(name, archive.namelist()), "w") as member:
+        while True:
+            chunk = workbook.read(EXPORT_ZIP_CHUNK_SIZE)
+            if not chunk:
+                break
+            member.write(chunk)
+            yield stream.drain()
+    workbook.close()
+    yield stream.drain()
+
+
+def stream_split_export(event: Event):
+    # Una sola lectura ordenada por empresa alimenta a la vez el consolidado y
+    # el libro de la empresa en curso; cada libro se agrega al zip al cerrarse
+    edition = f"{event.location} {event.year}"
+    tz = event_tz(event)
+    rows = db.session.execute(
+        select_records(event.event_id)
+        .order_by(User.company.asc(), ExhibitorScan.created_at.asc())
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    stream = _ZipStream()
+    archive = zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_STORED)
+    consolidated = RecordsExcelWriter(
+        f"{edition} - Todas las Marcas", ADMIN_EXPORT_COLUMNS
+    )
+    company_writer = None
+    company = None
+
+    for row in rows:
+        if company_writer is None or row.exhibitor_company != company:
+            if company_writer is not None:
+                yield from _add_workbook_to_zip(
+                    archive,
+                    stream,
+                    company_writer,
+                    f"Contactos CMC {company or 'Sin empresa'} {edition}",
+                )
+            company = row.exhibitor_company
+            company_writer = RecordsExcelWriter(edition, EXPORT_COLUMNS)
+        company_writer.write(serialize_export_record(row, tz))
+        consolidated.write(serialize_admin_export_record(row, tz))
+
+    if company_writer is not None:
+        yield from _add_workbook_to_zip(
+            archive,
+            stream,
+            company_writer,
+            f"Contactos CMC {company or 'Sin empresa'} {edition}",
+        )
+    yield from _add_workbook_to_zip(
+        archive, stream, consolidated, f"Contactos CMC Consolidado {edition}"
+    )
+    archive.close()
+    yield stream.drain()
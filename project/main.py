@@ -7,24 +7,86 @@ from flask import (
     jsonify,
     g,
     send_file,
+    Response,
+    stream_with_context,
 )
+import base64
+import json
 from flask_login import login_required, current_user
-from sqlalchemy import func, case
+from datetime import datetime, timedelta
+from sqlalchemy import func, literal, select, tuple_
+from sqlalchemy.exc import DataError
 from sqlalchemy.orm import joinedload
-from .models import User, Stats, ExhibitorScan, Event, Appointment
-from .auth import require_user_type
+from .models import (
+    User,
+    Stats,
+    ExhibitorScan,
+    ExhibitorScanTombstone,
+    Event,
+    Appointment,
+    EventDayCounter,
+    ExhibitorRollup,
+)
+from .auth import require_user_type, service_required
 from .events import (
     get_active_event,
     get_active_event_stats_preview,
     is_exhibitor_edit_window,
     invalidate_active_event_cache,
+    notify_active_event_changed,
+    active_event_cache_stats,
+)
+from .exports import (
+    EXPORT_MIMETYPES,
+    build_export_scope,
+    can_access_export,
+    ensure_export_artifact,
+    export_filename,
+    get_export_status,
+    open_export_artifact,
+    read_export_meta,
+    stream_export_csv,
+    stream_split_export,
+    submit_export,
+)
+from .state import (
+    build_records_channel,
+    build_user_room,
+    get_cached_records,
+    invalidate_cached_records,
+    publish_stats_sections,
+    records_cache_stats,
+    store_cached_records,
+)
+from .caching import (
+    build_etag,
+    bump_data_version,
+    conditional_json,
+    data_version_subquery,
+    records_version,
+    records_version_token,
+)
+from .records import (
+    select_records,
+    serialize_exhibitor_record,
+    serialize_admin_contact,
+)
+from .statistics import (
+    STATISTICS_PAGE_SECTIONS,
+    apply_stats_patch,
+    get_exhibitor_rollups,
+    get_stats_section_versions,
+    get_stats_sections,
+    parse_stats_patch,
 )
-from .excel_writer import create_records_excel_file
-from .appointments import set_appointment_status
 from . import db
 
 main = Blueprint("main", __name__)
 
+SYNC_CURSOR_OVERLAP_SECONDS = 5
+CONTACTS_PAGE_SIZE = 500
+CONTACTS_MAX_PAGE_SIZE = 2000
+
 
 @main.route("/")
 @login_required
@@ -74,33 +136,13 @@ def statistics_post():
 
     if option:
         stats_id = int(option)
-        stats_record = Stats.query.filter_by(stats_id=stats_id).first()
-        if stats_record:
-            stats = stats_record.stats
-            companies = stats["exhibitor_companies"]
-            scan_totals = (
-                ExhibitorScan.query.join(ExhibitorScan.user)
-                .outerjoin(
-                    Appointment, Appointment.e_scan_id == ExhibitorScan.e_scan_id
-                )
-                .filter(ExhibitorScan.event_id == stats_record.event_id)
-                .with_entities(
-                    User.company,
-                    func.count(ExhibitorScan.e_scan_id.distinct()),
-                    func.count(Appointment.e_scan_id),
-                    func.count(case((Appointment.status == True, 1))),
-                )
-                .group_by(User.company)
-                .all()
-            )
-            scan_dict = {
-                company.upper(): {
-                    "contact_count": contact_count,
-                    "appt_count": appt_count,
-                    "completed_appt_count": completed_appt_count,
-                }
-                for company, contact_count, appt_count, completed_appt_count in scan_totals
-            }
+        event_id, stats = get_stats_sections(
+            STATISTICS_PAGE_SECTIONS + ("exhibitor_companies",), stats_id=stats_id
+        )
+        if event_id is not None:
+            companies = stats.pop("exhibitor_companies") or []
+            # Totales por empresa mantenidos por las rutas de escaneo y citas
+            scan_dict = get_exhibitor_rollups(event_id)
 
             exhibitors_scans = []
 
@@ -121,6 +163,52 @@ def statistics_post():
     return jsonify({"stats": stats, "exhibitors_scans": exhibitors_scans})
 
 
+@main.route("/statistics/<int:event_id>/patch", methods=["POST"])
+@service_required
+def statistics_patch(event_id):
+    if not db.session.get(Event, event_id):
+        return jsonify({"error": "Sede no encontrada"}), 404
+
+    data = request.get_json(silent=True) or {}
+    try:
+        operations = parse_stats_patch(data.get("operations"))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    try:
+        versions = apply_stats_patch(event_id, operations)
+        db.session.commit()
+    except ValueError as exc:
+        db.session.rollback()
+        return jsonify({"error": str(exc)}), 400
+    except DataError:
+        db.session.rollback()
+        return (
+            jsonify(
+                {"error": "Una operación no coincide con el tipo del valor actual"}
+            ),
+            400,
+        )
+
+    # Sólo se reenvían a la página las secciones que cambiaron
+    changed = tuple(
+        section
+        for section in versions
+        if section in STATISTICS_PAGE_SECTIONS or section == "exhibitor_companies"
+    )
+    if changed:
+        _, sections = get_stats_sections(changed, event_id=event_id)
+        publish_stats_sections(event_id, sections, versions)
+
+    return jsonify({"ok": True, "versions": versions})
+
+
+@main.route("/statistics/<int:event_id>/versions")
+@service_required
+def statistics_versions(event_id):
+    return jsonify({"versions": get_stats_section_versions(event_id)})
+
+
 @main.route("/exhibitor-scanner")
 @login_required
 @require_user_type("ADMIN", "EXHIBITOR")
@@ -136,6 +224,17 @@ def exhibitor_scanner_post():
     qr_text = data.get("qr_data", "")
 
 
+def _parse_sync_cursor(value):
+    if not value:
+        return None
+    try:
+        cursor = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    # Margen para transacciones que terminaron después de calcular el cursor
+    return cursor - timedelta(seconds=SYNC_CURSOR_OVERLAP_SECONDS)
+
+
 @main.route("/exhibitor-records")
 @login_required
 @require_user_type("ADMIN", "EXHIBITOR")
@@ -143,62 +242,122 @@ def exhibitor_records():
     return render_template("exhibitor_records.html")
 
 
+@main.route("/exhibitor-records/list")
+@login_required
+@require_user_type("ADMIN", "EXHIBITOR")
+def exhibitor_records_list():
+    # Listado completo: el navegador lo revalida con If-None-Match
+    active_event = g.active_event
+    if not active_event:
+        return jsonify(_build_exhibitor_records_payload(None, None))
+
+    version = records_version(active_event.event_id, current_user.company)
+    etag = build_etag(
+        records_version_token(active_event.event_id, current_user.company, version),
+        is_exhibitor_edit_window(active_event),
+    )
+    return conditional_json(
+        etag,
+        lambda: _build_exhibitor_records_payload(active_event, None, version[-1]),
+    )
+
+
 @main.route("/exhibitor-records", methods=["POST"])
 @login_required
 @require_user_type("ADMIN", "EXHIBITOR")
 def exhibitor_records_post():
+    # Cambios desde el cursor `since`; el listado completo se pide por GET
     active_event = g.active_event
+    since = _parse_sync_cursor((request.get_json(silent=True) or {}).get("since"))
+    version = None
+    if active_event and not since:
+        version = records_version(active_event.event_id, current_user.company)[-1]
+    return jsonify(_build_exhibitor_records_payload(active_event, since, version))
+
+
+def _load_exhibitor_records(stmt, channel, version):
+    records = get_cached_records(channel, version) if channel else None
+    if records is None:
+        items = [
+            (row.created_at, serialize_exhibitor_record(row))
+            for row in db.session.execute(stmt)
+        ]
+        if channel:
+            store_cached_records(channel, version, items)
+        records = [record for _, record in items]
+    return records
+
+
+def _build_exhibitor_records_payload(active_event, since, version=None):
     records = []
+    deleted = []
     event_payload = None
     is_editable_window = False
+    next_cursor = None
 
     if active_event:
         is_editable_window = is_exhibitor_edit_window(active_event)
-        scan_records = (
-            ExhibitorScan.query.options(
-                joinedload(ExhibitorScan.appointment), joinedload(ExhibitorScan.user)
-            )
-            .join(ExhibitorScan.user)
-            .filter(
-                User.company == current_user.company,
-                ExhibitorScan.event_id == active_event.event_id,
-            )
-            .order_by(ExhibitorScan.created_at.asc())
-            .all()
-        )
-        records = [
-            {
-                "e_scan_id": scan.e_scan_id,
-                "day": scan.created_at.strftime("%d/%m/%Y"),
-                "scanned_a_last_name": scan.scanned_a_last_name,
-                "scanned_a_name": scan.scanned_a_name,
-                "scanned_a_phone": scan.scanned_a_phone,
-                "scanned_a_email": scan.scanned_a_email,
-                "scanned_a_company": scan.scanned_a_company,
-                "scanned_by_rep_name": scan.scanned_by_rep_name,
-                "scanned_by_login": scan.user.name,
-                "notes": scan.notes,
-                "appointment": scan.appointment.to_dict() if scan.appointment else None,
-            }
-            for scan in scan_records
-        ]
+        next_cursor = datetime.now().isoformat()
+        stmt = select_records(active_event.event_id, current_user.company)
+        if since:
+            stmt = stmt.where(ExhibitorScan.updated_at >= since)
+            deleted = [
+                e_scan_id
+                for (e_scan_id,) in db.session.query(ExhibitorScanTombstone.e_scan_id)
+                .filter(
+                    ExhibitorScanTombstone.event_id == active_event.event_id,
+                    ExhibitorScanTombstone.company == current_user.company,
+                    ExhibitorScanTombstone.deleted_at >= since,
+                )
+                .all()
+            ]
+        stmt = stmt.order_by(ExhibitorScan.created_at.asc())
+        if since:
+            records = [
+                serialize_exhibitor_record(row) for row in db.session.execute(stmt)
+            ]
+        else:
+            # Todo el equipo del expositor comparte el mismo listado serializado
+            channel = build_records_channel(current_user.company, active_event.event_id)
+            records = _load_exhibitor_records(stmt, channel, version)
         event_payload = {
             "event_id": active_event.event_id,
             "location": active_event.location,
             "year": active_event.year,
             "start_date": active_event.start_date.strftime("%d/%m/%Y"),
             "end_date": active_event.end_date.strftime("%d/%m/%Y"),
-            "total_records": len(records),
+            "total_records": None if since else len(records),
             "is_editable_window": is_editable_window,
         }
 
-    return jsonify(
-        {
-            "event": event_payload,
-            "records": records,
-            "current_user": current_user.company,
-            "is_editable_window": is_editable_window,
-        }
+    return {
+        "event": event_payload,
+        "records": records,
+        "deleted": deleted,
+        "is_delta": bool(since),
+        "next_cursor": next_cursor,
+        "current_user": current_user.company,
+        "is_editable_window": is_editable_window,
+    }
+
+
+def _export_response(scope, event):
+    filename = export_filename(scope, event)
+    if scope["format"] == "csv":
+        # El CSV se envía conforme se leen las filas, sin archivo intermedio
+        response = Response(
+            stream_with_context(stream_export_csv(scope)),
+            mimetype=EXPORT_MIMETYPES["csv"],
+        )
+        response.headers.set("Content-Disposition", "attachment", filename=filename)
+        return response
+
+    artifact, meta = ensure_export_artifact(scope, event)
+    return send_file(
+        artifact,
+        as_attachment=True,
+        download_name=meta["filename"],
+        mimetype=EXPORT_MIMETYPES[scope["format"]],
     )
 
 
@@ -207,57 +366,65 @@ def exhibitor_records_post():
 @require_user_type("ADMIN", "EXHIBITOR")
 def export_exhibitor_records():
     active_event = g.active_event
-    records = []
 
     if not active_event:
         return jsonify({"error": "No hay evento activo"}), 404
 
-    scan_records = (
-        ExhibitorScan.query.options(joinedload(ExhibitorScan.appointment))
-        .join(ExhibitorScan.user)
-        .filter(
-            User.company == current_user.company,
-            ExhibitorScan.event_id == active_event.event_id,
-        )
-        .order_by(ExhibitorScan.created_at.asc())
-        .all()
+    fmt = request.args.get("format", "xlsx")
+    if fmt not in EXPORT_MIMETYPES:
+        return jsonify({"error": "Formato no soportado"}), 400
+
+    return _export_response(
+        build_export_scope("exhibitor", active_event, current_user.company, fmt),
+        active_event,
     )
 
-    records = [
-        {
-            "DIA": scan.created_at.strftime("%d/%m/%Y"),
-            "NOMBRE(S)": scan.scanned_a_name,
-            "APELLIDO(S)": scan.scanned_a_last_name,
-            "TELEFONO": scan.scanned_a_phone,
-            "EMAIL": scan.scanned_a_email,
-            "EMPRESA": scan.scanned_a_company,
-            "NOTAS": scan.notes,
-            "CITA": "✓" if scan.appointment else "",
-            "FECHA CITA": scan.appointment.date if scan.appointment else "",
-            "ESTADO DE LA CITA": (
-                set_appointment_status(scan.appointment) if scan.appointment else "---"
-            ),
-            "REAGENDADA": (
-                "---"
-                if not scan.appointment
-                else (
-                    "✓"
-                    if (scan.appointment.created_at != scan.appointment.updated_at)
-                    else ""
-                )
-            ),
-        }
-        for scan in scan_records
-    ]
-    excel_file = create_records_excel_file(
-        records, f"{active_event.location} {active_event.year}"
+
+@main.route("/export-records", methods=["POST"])
+@login_required
+@require_user_type("ADMIN", "EXHIBITOR")
+def export_exhibitor_records_job():
+    active_event = g.active_event
+
+    if not active_event:
+        return jsonify({"error": "No hay evento activo"}), 404
+
+    fmt = (request.get_json(silent=True) or {}).get("format", "xlsx")
+    if fmt not in EXPORT_MIMETYPES:
+        return jsonify({"error": "Formato no soportado"}), 400
+
+    job = submit_export(
+        build_export_scope("exhibitor", active_event, current_user.company, fmt),
+        build_user_room(current_user.user_id),
     )
+    return jsonify(job), 202
+
+
+@main.route("/exports/<job_id>")
+@login_required
+@require_user_type("ADMIN", "EXHIBITOR")
+def export_job_status(job_id):
+    job, scope = get_export_status(job_id)
+    if job is None or not can_access_export(scope, current_user):
+        return jsonify({"error": "Exportación no encontrada"}), 404
+    return jsonify(job)
 
+
+@main.route("/exports/<job_id>/download")
+@login_required
+@require_user_type("ADMIN", "EXHIBITOR")
+def export_job_download(job_id):
+    meta = read_export_meta(job_id)
+    if meta is None or not can_access_export(meta, current_user):
+        return jsonify({"error": "Exportación no encontrada"}), 404
+    artifact = open_export_artifact(job_id)
+    if artifact is None:
+        return jsonify({"error": "Exportación no encontrada"}), 404
     return send_file(
-        excel_file,
+        artifact,
         as_attachment=True,
-        download_name=f"Contactos CMC {active_event.location} {active_event.year}",
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        download_name=meta["filename"],
+        mimetype=EXPORT_MIMETYPES[meta["format"]],
     )
 
 
@@ -281,52 +448,94 @@ def admin_contacts():
     )
 
 
+def _encode_contacts_cursor(company, created_at, e_scan_id):
+    raw = json.dumps([company, created_at.isoformat(), e_scan_id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_contacts_cursor(value):
+    if not value:
+        return None
+    try:
+        company, created_at, e_scan_id = json.loads(
+            base64.urlsafe_b64decode(value.encode("ascii"))
+        )
+        return company, datetime.fromisoformat(created_at), int(e_scan_id)
+    except (ValueError, TypeError):
+        return None
+
+
 @main.route("/admin/contacts/list")
 @login_required
 @require_user_type("ADMIN")
 def admin_contacts_list():
     event_id = request.args.get("event_id", type=int)
+    limit = min(
+        max(request.args.get("limit", CONTACTS_PAGE_SIZE, type=int), 1),
+        CONTACTS_MAX_PAGE_SIZE,
+    )
+    after = _decode_contacts_cursor(request.args.get("after"))
+    stream = request.args.get("format") == "ndjson"
     event = Event.query.get(event_id) if event_id else None
-    records = []
-    event_payload = None
 
-    if event:
-        scan_records = (
-            ExhibitorScan.query.options(
-                joinedload(ExhibitorScan.appointment), joinedload(ExhibitorScan.user)
+    if not event:
+        return jsonify({"event": None, "records": []})
+
+    company_key = func.coalesce(User.company, "")
+    stmt = select_records(event.event_id).order_by(
+        company_key.asc(),
+        ExhibitorScan.created_at.asc(),
+        ExhibitorScan.e_scan_id.asc(),
+    )
+    if after:
+        stmt = stmt.where(
+            tuple_(company_key, ExhibitorScan.created_at, ExhibitorScan.e_scan_id)
+            > tuple_(*after)
+        )
+
+    if stream:
+        # Cursor del lado del servidor: las filas se envían conforme llegan
+        def generate():
+            rows = db.session.execute(
+                stmt.execution_options(yield_per=CONTACTS_PAGE_SIZE)
             )
-            .join(ExhibitorScan.user)
-            .filter(ExhibitorScan.event_id == event.event_id)
-            .order_by(User.company.asc(), ExhibitorScan.created_at.asc())
-            .all()
+            for row in rows:
+                yield json.dumps(serialize_admin_contact(row)) + "\n"
+
+        return Response(
+            stream_with_context(generate()), mimetype="application/x-ndjson"
         )
-        records = [
-            {
-                "e_scan_id": scan.e_scan_id,
-                "day": scan.created_at.strftime("%d/%m/%Y"),
-                "empresa_expositora": scan.user.company,
-                "scanned_a_last_name": scan.scanned_a_last_name,
-                "scanned_a_name": scan.scanned_a_name,
-                "scanned_a_phone": scan.scanned_a_phone,
-                "scanned_a_email": scan.scanned_a_email,
-                "scanned_a_company": scan.scanned_a_company,
-                "scanned_by_rep_name": scan.scanned_by_rep_name,
-                "scanned_by_login": scan.user.name,
-                "appointment_status": (
-                    set_appointment_status(scan.appointment)
-                    if scan.appointment
-                    else "Sin Cita"
-                ),
-            }
-            for scan in scan_records
-        ]
+
+    def build_payload():
+        next_cursor = None
+        rows = db.session.execute(stmt.limit(limit + 1)).all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = _encode_contacts_cursor(
+                last.exhibitor_company or "", last.created_at, last.e_scan_id
+            )
+        records = [serialize_admin_contact(row) for row in rows]
         event_payload = {
             "location": event.location,
             "year": event.year,
-            "total_records": len(records),
+            "total_records": (
+                None
+                if after
+                else ExhibitorScan.query.filter(
+                    ExhibitorScan.event_id == event.event_id
+                ).count()
+            ),
         }
+        return {"event": event_payload, "records": records, "next_cursor": next_cursor}
 
-    return jsonify({"event": event_payload, "records": records})
+    # El estado de las citas depende de la hora, por eso el minuto entra en la ETag
+    etag = build_etag(
+        records_version_token(event.event_id),
+        request.query_string.decode("utf-8"),
+        datetime.now().strftime("%H:%M"),
+    )
+    return conditional_json(etag, build_payload)
 
 
 @main.route("/admin/contacts/export")
@@ -339,54 +548,54 @@ def admin_contacts_export():
     if not event:
         return jsonify({"error": "Selecciona una sede"}), 404
 
-    scan_records = (
-        ExhibitorScan.query.options(
-            joinedload(ExhibitorScan.appointment), joinedload(ExhibitorScan.user)
-        )
-        .join(ExhibitorScan.user)
-        .filter(ExhibitorScan.event_id == event.event_id)
-        .order_by(User.company.asc(), ExhibitorScan.created_at.asc())
-        .all()
-    )
+    fmt = request.args.get("format", "xlsx")
+    if fmt not in EXPORT_MIMETYPES:
+        return jsonify({"error": "Formato no soportado"}), 400
 
-    records = [
-        {
-            "EMPRESA EXPOSITORA": scan.user.company,
-            "DIA": scan.created_at.strftime("%d/%m/%Y"),
-            "NOMBRE(S)": scan.scanned_a_name,
-            "APELLIDO(S)": scan.scanned_a_last_name,
-            "TELEFONO": scan.scanned_a_phone,
-            "EMAIL": scan.scanned_a_email,
-            "EMPRESA": scan.scanned_a_company,
-            "ESCANEADO POR": scan.scanned_by_rep_name or scan.user.name,
-            "NOTAS": scan.notes,
-            "CITA": "✓" if scan.appointment else "",
-            "FECHA CITA": scan.appointment.date if scan.appointment else "",
-            "ESTADO DE LA CITA": (
-                set_appointment_status(scan.appointment) if scan.appointment else "---"
-            ),
-            "REAGENDADA": (
-                "---"
-                if not scan.appointment
-                else (
-                    "✓"
-                    if (scan.appointment.created_at != scan.appointment.updated_at)
-                    else ""
-                )
-            ),
-        }
-        for scan in scan_records
-    ]
-    excel_file = create_records_excel_file(
-        records, f"{event.location} {event.year} - Todas las Marcas"
+    return _export_response(build_export_scope("admin", event, fmt=fmt), event)
+
+
+@main.route("/admin/contacts/export-split")
+@login_required
+@require_user_type("ADMIN")
+def admin_contacts_export_split():
+    event_id = request.args.get("event_id", type=int)
+    event = Event.query.get(event_id) if event_id else None
+
+    if not event:
+        return jsonify({"error": "Selecciona una sede"}), 404
+
+    response = Response(
+        stream_with_context(stream_split_export(event)), mimetype="application/zip"
+    )
+    response.headers.set(
+        "Content-Disposition",
+        "attachment",
+        filename=f"Contactos CMC {event.location} {event.year} por Marca.zip",
     )
+    return response
 
-    return send_file(
-        excel_file,
-        as_attachment=True,
-        download_name=f"Contactos CMC Consolidado {event.location} {event.year}",
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+
+@main.route("/admin/contacts/export", methods=["POST"])
+@login_required
+@require_user_type("ADMIN")
+def admin_contacts_export_job():
+    data = request.get_json(silent=True) or {}
+    event_id = data.get("event_id")
+    event = Event.query.get(event_id) if event_id else None
+
+    if not event:
+        return jsonify({"error": "Selecciona una sede"}), 404
+
+    fmt = data.get("format", "xlsx")
+    if fmt not in EXPORT_MIMETYPES:
+        return jsonify({"error": "Formato no soportado"}), 400
+
+    job = submit_export(
+        build_export_scope("admin", event, fmt=fmt),
+        build_user_room(current_user.user_id),
     )
+    return jsonify(job), 202
 
 
 @main.route("/admin/contacts/purge", methods=["POST"])
@@ -432,6 +641,20 @@ def admin_contacts_purge():
         .all()
     ]
 
+    db.session.execute(
+        ExhibitorScanTombstone.__table__.insert().from_select(
+            ["e_scan_id", "event_id", "company", "deleted_at"],
+            select(
+                ExhibitorScan.e_scan_id,
+                ExhibitorScan.event_id,
+                User.company,
+                literal(datetime.now()),
+            )
+            .join(User, User.user_id == ExhibitorScan.user_id)
+            .where(ExhibitorScan.event_id == event.event_id),
+        )
+    )
+
     deleted_appointments = 0
     if e_scan_ids:
         deleted_appointments = Appointment.query.filter(
@@ -441,8 +664,15 @@ def admin_contacts_purge():
     deleted_contacts = ExhibitorScan.query.filter(
         ExhibitorScan.event_id == event.event_id
     ).delete(synchronize_session=False)
+    EventDayCounter.query.filter(EventDayCounter.event_id == event.event_id).delete(
+        synchronize_session=False
+    )
+    ExhibitorRollup.query.filter(ExhibitorRollup.event_id == event.event_id).delete(
+        synchronize_session=False
+    )
 
     db.session.commit()
+    invalidate_cached_records(event.event_id)
 
     return jsonify(
         {
@@ -454,6 +684,15 @@ def admin_contacts_purge():
     )
 
 
+@main.route("/admin/cache-stats")
+@login_required
+@require_user_type("ADMIN")
+def admin_cache_stats():
+    return jsonify(
+        {"records": records_cache_stats(), "active_event": active_event_cache_stats()}
+    )
+
+
 # ----------- NUEVA RUTA PARA CITAS------------
 @main.route("/exhibitor-appointments")
 @login_required
@@ -497,6 +736,18 @@ def admin_events():
 @login_required
 @require_user_type("ADMIN")
 def admin_events_list():
+    total, max_event_id, version = db.session.execute(
+        select(
+            func.count(Event.event_id),
+            func.max(Event.event_id),
+            data_version_subquery("events"),
+        )
+    ).one()
+    etag = build_etag("events", total, max_event_id, version)
+    return conditional_json(etag, _build_admin_events_payload)
+
+
+def _build_admin_events_payload():
     events = Event.query.order_by(Event.start_date.desc()).all()
     active_event = get_active_event()
     active_event_id = active_event.event_id if active_event else None
@@ -523,7 +774,7 @@ def admin_events_list():
             }
         )
 
-    return jsonify({"events": payload})
+    return {"events": payload}
 
 
 @main.route("/admin/events/set-status", methods=["POST"])
@@ -550,6 +801,8 @@ def admin_events_set_status():
     else:
         return jsonify({"success": False, "message": "Acción inválida"}), 400
 
+    bump_data_version("events")
+    notify_active_event_changed()
     db.session.commit()
     invalidate_active_event_cache()
 
@@ -3,6 +3,7 @@ from sqlalchemy.dialects.postgresql import JSONB
 from flask_login import UserMixin
 from bcrypt import checkpw, gensalt, hashpw
 from datetime import datetime
+from hashlib import sha1
 
 
 class User(UserMixin, db.Model):
@@ -87,6 +88,7 @@ class ExhibitorScan(db.Model):
         db.DateTime, default=datetime.now(), nullable=False, index=True
     )
     updated_at = db.Column(db.DateTime, default=datetime.now(), nullable=False)
+    dedup_key = db.Column(db.String(40))
 
     user = db.relationship("User", back_populates="e_scans")
     event = db.relationship("Event", back_populates="e_scans_ev")
@@ -98,6 +100,25 @@ class ExhibitorScan(db.Model):
         cascade="all, delete-orphan",
     )
 
+    __table_args__ = (
+        db.Index(
+            "uq_exhibitors_scans_dedup",
+            "user_id",
+            "event_id",
+            "dedup_key",
+            unique=True,
+        ),
+        db.Index("ix_exhibitors_scans_event_updated", "event_id", "updated_at"),
+    )
+
+    @staticmethod
+    def build_dedup_key(last_name, name, email, company):
+        normalized = "|".join(
+            " ".join((value or "").split()).casefold()
+            for value in (last_name, name, email, company)
+        )
+        return sha1(normalized.encode("utf-8")).hexdigest()
+
     def to_dict(self):
         return {
             "e_scan_id": self.e_scan_id,
@@ -143,3 +164,70 @@ class Appointment(db.Model):
             "location": self.location,
             "status": self.status,
         }
+
+
+class ExhibitorScanTombstone(db.Model):
+    __tablename__ = "exhibitors_scans_tombstones"
+
+    tombstone_id = db.Column(db.Integer, primary_key=True)
+    e_scan_id = db.Column(db.Integer, nullable=False)
+    event_id = db.Column(db.Integer, nullable=False)
+    company = db.Column(db.String(255))
+    deleted_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+    __table_args__ = (
+        db.Index(
+            "ix_exhibitors_scans_tombstones_event_deleted", "event_id", "deleted_at"
+        ),
+    )
+
+
+class DataVersion(db.Model):
+    __tablename__ = "data_versions"
+
+    scope = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class EventDayCounter(db.Model):
+    __tablename__ = "event_day_counters"
+
+    event_id = db.Column(db.Integer, db.ForeignKey("events.event_id"), primary_key=True)
+    day = db.Column(db.String(20), primary_key=True)
+    appointments_scheduled = db.Column(db.Integer, nullable=False, default=0)
+    appointments_completed = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ExhibitorRollup(db.Model):
+    __tablename__ = "exhibitor_rollups"
+
+    event_id = db.Column(db.Integer, db.ForeignKey("events.event_id"), primary_key=True)
+    company = db.Column(db.String(255), primary_key=True)
+    contact_count = db.Column(db.Integer, nullable=False, default=0)
+    appt_count = db.Column(db.Integer, nullable=False, default=0)
+    completed_appt_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class QueuedScan(db.Model):
+    __tablename__ = "scan_queue"
+
+    scan_id = db.Column(db.String(36), primary_key=True)
+    vcard = db.Column(db.Text, nullable=False)
+    date = db.Column(db.String(32), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="pending")
+    room = db.Column(db.String(64))
+    lease_id = db.Column(db.String(32), index=True)
+    lease_expires_at = db.Column(db.DateTime)
+    result = db.Column(JSONB)
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+    __table_args__ = (db.Index("ix_scan_queue_status_created", "status", "created_at"),)
+
+    def to_dict(self):
+        return {
+            "vcard": self.vcard,
+            "date": self.date,
+            "status": self.status,
+            "room": self.room,
+        }
@@ -0,0 +1,182 @@
+from types import SimpleNamespace
+
+from sqlalchemy import select
+
+from .models import ExhibitorScan, User, Appointment
+from .appointments import appointment_status_label
+
+# Columnas exactas que usan los listados y exportaciones: se leen como filas
+# de Core sin hidratar objetos del ORM
+RECORD_COLUMNS = (
+    ExhibitorScan.e_scan_id,
+    ExhibitorScan.event_id,
+    ExhibitorScan.scanned_a_last_name,
+    ExhibitorScan.scanned_a_name,
+    ExhibitorScan.scanned_a_phone,
+    ExhibitorScan.scanned_a_email,
+    ExhibitorScan.scanned_a_company,
+    ExhibitorScan.scanned_by_rep_name,
+    ExhibitorScan.notes,
+    ExhibitorScan.created_at,
+    ExhibitorScan.updated_at,
+    User.company.label("exhibitor_company"),
+    User.name.label("exhibitor_login"),
+    Appointment.appointment_id,
+    Appointment.date.label("appointment_date"),
+    Appointment.hour.label("appointment_hour"),
+    Appointment.description.label("appointment_description"),
+    Appointment.location.label("appointment_location"),
+    Appointment.status.label("appointment_status"),
+    Appointment.created_at.label("appointment_created_at"),
+    Appointment.updated_at.label("appointment_updated_at"),
+)
+
+
+def select_records(event_id: int, company=None):
+    stmt = (
+        select(*RECORD_COLUMNS)
+        .select_from(ExhibitorScan)
+        .join(User, User.user_id == ExhibitorScan.user_id)
+        .outerjoin(Appointment, Appointment.e_scan_id == ExhibitorScan.e_scan_id)
+        .where(ExhibitorScan.event_id == event_id)
+    )
+    if company is not None:
+        stmt = stmt.where(User.company == company)
+    return stmt
+
+
+def serialize_appointment(row):
+    if row.appointment_id is None:
+        return None
+    return {
+        "appointment_id": row.appointment_id,
+        "e_scan_id": row.e_scan_id,
+        "date": row.appointment_date,
+        "hour": row.appointment_hour,
+        "description": row.appointment_description,
+        "location": row.appointment_location,
+        "status": row.appointment_status,
+    }
+
+
+def record_appointment_status(row, default: str, tz=None):
+    if row.appointment_id is None:
+        return default
+    return appointment_status_label(
+        row.appointment_status, row.appointment_date, row.appointment_hour, tz
+    )
+
+
+def record_rescheduled(row):
+    if row.appointment_id is None:
+        return "---"
+    return "✓" if row.appointment_created_at != row.appointment_updated_at else ""
+
+
+def serialize_exhibitor_record(row):
+    return {
+        "e_scan_id": row.e_scan_id,
+        "day": row.created_at.strftime("%d/%m/%Y"),
+        "scanned_a_last_name": row.scanned_a_last_name,
+        "scanned_a_name": row.scanned_a_name,
+        "scanned_a_phone": row.scanned_a_phone,
+        "scanned_a_email": row.scanned_a_email,
+        "scanned_a_company": row.scanned_a_company,
+        "scanned_by_rep_name": row.scanned_by_rep_name,
+        "scanned_by_login": row.exhibitor_login,
+        "notes": row.notes,
+        "appointment": serialize_appointment(row),
+    }
+
+
+def serialize_inserted_record(e_scan_id, values: dict, exhibitor_login):
+    # Contacto recién insertado: mismas columnas que el listado, aún sin cita
+    return serialize_exhibitor_record(
+        SimpleNamespace(
+            e_scan_id=e_scan_id,
+            exhibitor_login=exhibitor_login,
+            appointment_id=None,
+            **values,
+        )
+    )
+
+
+def serialize_admin_contact(row):
+    return {
+        "e_scan_id": row.e_scan_id,
+        "day": row.created_at.strftime("%d/%m/%Y"),
+        "empresa_expositora": row.exhibitor_company,
+        "scanned_a_last_name": row.scanned_a_last_name,
+        "scanned_a_name": row.scanned_a_name,
+        "scanned_a_phone": row.scanned_a_phone,
+        "scanned_a_email": row.scanned_a_email,
+        "scanned_a_company": row.scanned_a_company,
+        "scanned_by_rep_name": row.scanned_by_rep_name,
+        "scanned_by_login": row.exhibitor_login,
+        "appointment_status": record_appointment_status(row, "Sin Cita"),
+    }
+
+
+# Columnas de las exportaciones, en el orden de las hojas de Excel
+EXPORT_COLUMNS = (
+    "DIA",
+    "NOMBRE(S)",
+    "APELLIDO(S)",
+    "TELEFONO",
+    "EMAIL",
+    "EMPRESA",
+    "NOTAS",
+    "CITA",
+    "FECHA CITA",
+    "ESTADO DE LA CITA",
+    "REAGENDADA",
+)
+ADMIN_EXPORT_COLUMNS = (
+    "EMPRESA EXPOSITORA",
+    "DIA",
+    "NOMBRE(S)",
+    "APELLIDO(S)",
+    "TELEFONO",
+    "EMAIL",
+    "EMPRESA",
+    "ESCANEADO POR",
+    "NOTAS",
+    "CITA",
+    "FECHA CITA",
+    "ESTADO DE LA CITA",
+    "REAGENDADA",
+)
+
+
+def serialize_export_record(row, tz=None):
+    return {
+        "DIA": row.created_at.strftime("%d/%m/%Y"),
+        "NOMBRE(S)": row.scanned_a_name,
+        "APELLIDO(S)": row.scanned_a_last_name,
+        "TELEFONO": row.scanned_a_phone,
+        "EMAIL": row.scanned_a_email,
+        "EMPRESA": row.scanned_a_company,
+        "NOTAS": row.notes,
+        "CITA": "✓" if row.appointment_id is not None else "",
+        "FECHA CITA": row.appointment_date or "",
+        "ESTADO DE LA CITA": record_appointment_status(row, "---", tz),
+        "REAGENDADA": record_rescheduled(row),
+    }
+
+
+def serialize_admin_export_record(row, tz=None):
+    return {
+        "EMPRESA EXPOSITORA": row.exhibitor_company,
+        "DIA": row.created_at.strftime("%d/%m/%Y"),
+        "NOMBRE(S)": row.scanned_a_name,
+        "APELLIDO(S)": row.scanned_a_last_name,
+        "TELEFONO": row.scanned_a_phone,
+        "EMAIL": row.scanned_a_email,
+        "EMPRESA": row.scanned_a_company,
+        "ESCANEADO POR": row.scanned_by_rep_name or row.exhibitor_login,
+        "NOTAS": row.notes,
+        "CITA": "✓" if row.appointment_id is not None else "",
+        "FECHA CITA": row.appointment_date or "",
+        "ESTADO DE LA CITA": record_appointment_status(row, "---", tz),
+        "REAGENDADA": record_rescheduled(row),
+    }
@@ -0,0 +1,24 @@
+from flask.ctx import _AppCtxGlobals
+
+
+class LazyRequestGlobals(_AppCtxGlobals):
+    # Valores de `g` que se calculan la primera vez que una vista o plantilla
+    # los lee; las rutas que nunca los usan no pagan ninguna consulta
+    loaders = {}
+
+    def __getattr__(self, name: str):
+        loader = self.loaders.get(name)
+        if loader is None:
+            return super().__getattr__(name)
+        value = loader()
+        setattr(self, name, value)
+        return value
+
+    def get(self, name: str, default=None):
+        if name not in self.__dict__ and name in self.loaders:
+            return getattr(self, name)
+        return super().get(name, default)
+
+
+def register_lazy_global(name: str, loader):
+    LazyRequestGlobals.loaders[name] = loader
@@ -2,21 +2,28 @@ from flask import Blueprint, request, jsonify, g, Response, session
 from flask_login import login_required, current_user
 from uuid import uuid4
 from datetime import datetime, date, timedelta
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import joinedload
 
 from .state import (
-    pending_scans,
-    scan_results,
-    lock,
     build_records_channel,
+    build_scan_room,
+    patch_cached_records,
+    publish_exhibitor_scan_deltas,
     publish_records_event,
 )
+from .scan_queue import get_scan_queue
+from .caching import bump_records_version
+from .records import serialize_inserted_record
+from .statistics import bump_exhibitor_rollup
 
 from .auth import service_required, require_user_type
 from .models import ExhibitorScan, Appointment
-from .events import is_exhibitor_edit_window, event_tz
+from .events import is_exhibitor_edit_window, event_tz, bump_appointment_counters
 from . import db, socketio
 
+DEDUP_INDEX_ELEMENTS = ["user_id", "event_id", "dedup_key"]
+
 
 def get_location():
     event = g.get("active_event")
@@ -31,32 +38,73 @@ def get_location():
 
 
 def insert_scan_record(attendee: dict, event_id):
+    now = datetime.now()
+    values = {
+        "user_id": current_user.user_id,
+        "event_id": event_id,
+        "scanned_a_last_name": attendee.get("scanned_a_last_name", ""),
+        "scanned_a_name": attendee.get("scanned_a_name", ""),
+        "scanned_a_phone": attendee.get("scanned_a_phone", ""),
+        "scanned_a_email": attendee.get("scanned_a_email", ""),
+        "scanned_a_company": attendee.get("scanned_a_company", ""),
+        "scanned_by_rep_name": session.get("scanned_by_rep_name"),
+        "notes": attendee.get("notes", ""),
+        "dedup_key": build_attendee_dedup_key(attendee),
+        "created_at": now,
+        "updated_at": now,
+    }
+    # Un solo INSERT decide si el contacto es nuevo o repetido
+    e_scan_id = db.session.execute(
+        pg_insert(ExhibitorScan)
+        .values(**values)
+        .on_conflict_do_nothing(index_elements=DEDUP_INDEX_ELEMENTS)
+        .returning(ExhibitorScan.e_scan_id)
+    ).scalar()
+
+    if e_scan_id is None:
+        db.session.commit()
+        return False, None
 
-    record = ExhibitorScan(
-        user_id=current_user.user_id,
-        event_id=event_id,
-        scanned_a_last_name=attendee.get("scanned_a_last_name", ""),
-        scanned_a_name=attendee.get("scanned_a_name", ""),
-        scanned_a_phone=attendee.get("scanned_a_phone", ""),
-        scanned_a_email=attendee.get("scanned_a_email", ""),
-        scanned_a_company=attendee.get("scanned_a_company", ""),
-        scanned_by_rep_name=session.get("scanned_by_rep_name"),
-        notes=attendee.get("notes", ""),
-        created_at=datetime.now(),
-        updated_at=datetime.now(),
-    )
-    db.session.add(record)
-    db.session.commit()
     channel = build_records_channel(current_user.company, event_id)
+    version = bump_records_version(channel)
+    bump_exhibitor_rollup(event_id, current_user.company, contacts=1)
+    db.session.commit()
+    publish_exhibitor_scan_deltas(event_id, current_user.company, contacts=1)
+
+    record = serialize_inserted_record(e_scan_id, values, current_user.name)
     if channel:
-        publish_records_event(
-            channel, {"type": "record_created", "e_scan_id": record.e_scan_id}
-        )
-    return True, record.to_dict()
+        patch_cached_records(channel, version, created=[(now, record)])
+    return True, record
+
+
+def build_attendee_dedup_key(attendee: dict):
+    return ExhibitorScan.build_dedup_key(
+        attendee.get("scanned_a_last_name", ""),
+        attendee.get("scanned_a_name", ""),
+        attendee.get("scanned_a_email", ""),
+        attendee.get("scanned_a_company", ""),
+    )
 
 
 scan = Blueprint("scan", __name__)
 
+SCAN_STATUS_MAX_WAIT_SECONDS = 20
+PENDING_SCANS_MAX_WAIT_SECONDS = 30
+LEASE_DEFAULT_LIMIT = 20
+LEASE_MAX_LIMIT = 200
+LEASE_DEFAULT_SECONDS = 30
+LEASE_MAX_SECONDS = 300
+SCAN_RESULT_BATCH_MAX_ITEMS = 500
+EXHIBITOR_SCAN_BATCH_MAX_ITEMS = 200
+
+
+def _parse_wait(value, max_wait: float):
+    try:
+        wait = float(value or 0)
+    except (TypeError, ValueError):
+        return 0
+    return min(max(wait, 0), max_wait)
+
 
 @scan.route("/scan", methods=["POST"])
 @login_required
@@ -67,53 +115,196 @@ def recieve_scan():
     scan_id = str(uuid4())
     event = g.get("active_event")
     scanned_at = datetime.now(event_tz(event)).isoformat(timespec="seconds")
-    with lock:
-        pending_scans[scan_id] = {
+    get_scan_queue().enqueue(
+        scan_id,
+        {
             "vcard": data.get("qr_data", ""),
             "date": scanned_at,
-            "status": "pending",
-        }
+            "room": build_scan_room(current_user.user_id),
+        },
+    )
     return jsonify({"scan_id": scan_id})
 
 
 @scan.route("/pending-scans")
 @service_required
 def pending():
-    with lock:
-        scans = [
-            {"scan_id": k, **v}
-            for k, v in pending_scans.items()
-            if v["status"] == "pending"
-        ]
+    wait = _parse_wait(request.args.get("wait"), PENDING_SCANS_MAX_WAIT_SECONDS)
+    scan_queue = get_scan_queue()
+    scans = scan_queue.pending()
+
+    if not scans and wait:
+        db.session.close()
+        if scan_queue.wait_for_pending(wait):
+            scans = scan_queue.pending()
+
     return jsonify(scans)
 
 
+@scan.route("/pending-scans/lease", methods=["POST"])
+@service_required
+def lease_pending():
+    data = request.get_json(silent=True) or {}
+    try:
+        limit = int(data.get("limit", LEASE_DEFAULT_LIMIT))
+        lease_seconds = float(data.get("lease_seconds", LEASE_DEFAULT_SECONDS))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Parámetros de lease inválidos"}), 400
+
+    limit = min(max(limit, 1), LEASE_MAX_LIMIT)
+    lease_seconds = min(max(lease_seconds, 1), LEASE_MAX_SECONDS)
+    wait = _parse_wait(data.get("wait"), PENDING_SCANS_MAX_WAIT_SECONDS)
+
+    scan_queue = get_scan_queue()
+    cursor, scans = scan_queue.lease(limit, lease_seconds)
+    if not scans and wait:
+        db.session.close()
+        if scan_queue.wait_for_pending(wait):
+            cursor, scans = scan_queue.lease(limit, lease_seconds)
+    return jsonify(
+        {
+            "cursor": cursor,
+            "lease_seconds": lease_seconds,
+            "scans": scans,
+        }
+    )
+
+
+@scan.route("/pending-scans/ack", methods=["POST"])
+@service_required
+def ack_pending():
+    data = request.get_json(silent=True) or {}
+    cursor = data.get("cursor")
+    if not cursor:
+        return jsonify({"error": "Cursor requerido"}), 400
+
+    scan_ids = data.get("scan_ids")
+    acked = get_scan_queue().ack(
+        cursor, set(scan_ids) if scan_ids is not None else None
+    )
+    return jsonify({"ok": True, "acked": acked})
+
+
+@scan.route("/scan-state-stats")
+@service_required
+def scan_state_stats_view():
+    return jsonify(get_scan_queue().stats())
+
+
 @scan.route("/scan-result", methods=["POST"])
 @service_required
 def scan_result():
     data = request.json
     scan_id = data["scan_id"]
+    if not isinstance(scan_id, str):
+        return jsonify({"error": "scan_id debe ser texto"}), 400
 
-    with lock:
-        if scan_id not in pending_scans:
-            return jsonify({"error": "Escaneo no encontrado"}), 400
+    result = {
+        "result": data["result"],
+        "status": data["status"],
+        "message": data.get("message"),
+    }
+    found, room = get_scan_queue().complete(scan_id, result)
+    if not found:
+        return jsonify({"error": "Escaneo no encontrado"}), 400
 
-        pending_scans[scan_id]["status"] = "done"
-        scan_results[scan_id] = {
-            "result": data["result"],
-            "status": data["status"],
-            "message": data.get("message"),
-        }
+    if room:
+        socketio.emit("scan_result", {"scan_id": scan_id, **result}, room=room)
 
     return jsonify({"ok": True})
 
 
+@scan.route("/scan-result/batch", methods=["POST"])
+@service_required
+def scan_result_batch():
+    data = request.get_json(silent=True)
+    items = data.get("results") if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return jsonify({"error": "Se esperaba una lista de resultados"}), 400
+    if len(items) > SCAN_RESULT_BATCH_MAX_ITEMS:
+        return (
+            jsonify(
+                {
+                    "error": f"Máximo {SCAN_RESULT_BATCH_MAX_ITEMS} resultados por lote",
+                }
+            ),
+            400,
+        )
+
+    if any(
+        isinstance(item, dict)
+        and not isinstance(item.get("scan_id"), (str, type(None)))
+        for item in items
+    ):
+        return jsonify({"error": "scan_id debe ser texto"}), 400
+
+    responses = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        if (
+            not isinstance(item, dict)
+            or not item.get("scan_id")
+            or "result" not in item
+            or "status" not in item
+        ):
+            responses[index] = {
+                "scan_id": item.get("scan_id") if isinstance(item, dict) else None,
+                "ok": False,
+                "error": "Resultado inválido",
+            }
+            continue
+        result = {
+            "result": item["result"],
+            "status": item["status"],
+            "message": item.get("message"),
+        }
+        valid.append((index, item["scan_id"], result))
+
+    outcomes = get_scan_queue().complete_many(
+        [(scan_id, result) for _, scan_id, result in valid]
+    )
+
+    for (index, scan_id, result), (found, room) in zip(valid, outcomes):
+        if not found:
+            responses[index] = {
+                "scan_id": scan_id,
+                "ok": False,
+                "error": "Escaneo no encontrado",
+            }
+            continue
+        responses[index] = {"scan_id": scan_id, "ok": True}
+        if room:
+            socketio.emit("scan_result", {"scan_id": scan_id, **result}, room=room)
+
+    return jsonify(
+        {
+            "ok": all(response["ok"] for response in responses),
+            "results": responses,
+        }
+    )
+
+
 @scan.route("/scan-status/<scan_id>")
 @login_required
 @require_user_type("ADMIN", "STAFF")
 def scan_status(scan_id):
-    with lock:
-        result = scan_results.get(scan_id)
+    wait = _parse_wait(request.args.get("wait"), SCAN_STATUS_MAX_WAIT_SECONDS)
+    scan_queue = get_scan_queue()
+    result = scan_queue.get_result(scan_id)
+
+    if not result and not scan_queue.is_known(scan_id):
+        # Pudo completarse entre ambas lecturas. Si no, este worker no lo
+        # conoce (cola en memoria de otro worker) o ya expiró: el cliente
+        # espaciará sus consultas en lugar de repetirlas de inmediato
+        result = scan_queue.get_result(scan_id)
+        if not result:
+            return jsonify({"status": "unknown"})
+
+    if not result and wait:
+        # Libera la conexión a la BD mientras el cliente espera el resultado
+        db.session.close()
+        if scan_queue.wait_for_result(scan_id, wait):
+            result = scan_queue.get_result(scan_id)
 
     if not result:
         return jsonify({"status": "pending"})
@@ -154,37 +345,32 @@ def process_exhibitor_scan():
             400,
         )
 
-    record = (
-        ExhibitorScan.query.options(joinedload(ExhibitorScan.appointment))
-        .filter(
-            ExhibitorScan.user_id == current_user.user_id,
-            ExhibitorScan.event_id == event.event_id,
-            ExhibitorScan.scanned_a_last_name
-            == attendee.get("scanned_a_last_name", ""),
-            ExhibitorScan.scanned_a_name == attendee.get("scanned_a_name", ""),
-            ExhibitorScan.scanned_a_email == attendee.get("scanned_a_email", ""),
-            ExhibitorScan.scanned_a_company == attendee.get("scanned_a_company", ""),
-        )
-        .first()
-    )
+    result, record = insert_scan_record(attendee, event.event_id)
 
-    if record:
+    if not result:
+        existing = (
+            ExhibitorScan.query.options(joinedload(ExhibitorScan.appointment))
+            .filter(
+                ExhibitorScan.user_id == current_user.user_id,
+                ExhibitorScan.event_id == event.event_id,
+                ExhibitorScan.dedup_key == build_attendee_dedup_key(attendee),
+            )
+            .first()
+        )
         return jsonify(
             {
                 "result": True,
                 "status": "repeated",
-                "record": record.to_dict(),
-                "notes": record.notes,
+                "record": existing.to_dict() if existing else None,
+                "notes": existing.notes if existing else "",
                 "message": "Contacto ya guardado",
                 "current_user": current_user.company,
             }
         )
 
-    result, record = insert_scan_record(attendee, event.event_id)
-
     channel = build_records_channel(current_user.company, event.event_id)
 
-    if channel and record:
+    if channel:
         publish_records_event(channel, {"type": "record_created", "record": record})
 
     return jsonify(
@@ -198,6 +384,189 @@ def process_exhibitor_scan():
     )
 
 
+def _parse_client_scanned_at(value, now: datetime):
+    # Hora del dispositivo convertida a la hora local del servidor, como datetime.now()
+    if not value:
+        return now
+    try:
+        scanned_at = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return now
+    if scanned_at.tzinfo is not None:
+        scanned_at = scanned_at.astimezone().replace(tzinfo=None)
+    return min(scanned_at, now)
+
+
+@scan.route("/exhibitor-scan/batch", methods=["POST"])
+@login_required
+@require_user_type("ADMIN", "EXHIBITOR")
+def process_exhibitor_scan_batch():
+    data = request.get_json(silent=True) or {}
+    items = data.get("scans")
+    if not isinstance(items, list):
+        return (
+            jsonify({"result": False, "message": "Se esperaba una lista de escaneos"}),
+            400,
+        )
+    if len(items) > EXHIBITOR_SCAN_BATCH_MAX_ITEMS:
+        return (
+            jsonify(
+                {
+                    "result": False,
+                    "message": f"Máximo {EXHIBITOR_SCAN_BATCH_MAX_ITEMS} escaneos por lote",
+                }
+            ),
+            400,
+        )
+
+    event = g.get("active_event")
+    if event is None:
+        return (
+            jsonify(
+                {
+                    "result": False,
+                    "message": "No hay evento activo para registrar el escaneo",
+                }
+            ),
+            400,
+        )
+
+    tz = event_tz(event)
+    now = datetime.now()
+    rep_name = session.get("scanned_by_rep_name")
+    results = []
+    rows = {}
+    # Cada resultado devuelve la llave del escaneo para que el cliente quite de
+    # su cola exactamente esos elementos; los reenvíos se resuelven por
+    # dedup_key como "repeated"
+    for item in items:
+        if not isinstance(item, dict):
+            results.append(
+                {
+                    "idempotency_key": None,
+                    "status": "error",
+                    "message": "Escaneo inválido",
+                }
+            )
+            continue
+        idempotency_key = item.get("idempotency_key")
+        if not isinstance(idempotency_key, str):
+            idempotency_key = None
+        created_at = _parse_client_scanned_at(item.get("scanned_at"), now)
+        day = (created_at.astimezone(tz).date() - event.start_date).days + 1
+        if day not in (3, 4):
+            results.append(
+                {
+                    "idempotency_key": idempotency_key,
+                    "status": "error",
+                    "message": "Escaneo fuera de las fechas permitidas",
+                }
+            )
+            continue
+
+        dedup_key = build_attendee_dedup_key(item)
+        results.append({"idempotency_key": idempotency_key, "dedup_key": dedup_key})
+        # El primer escaneo de cada contacto dentro del lote es el que se inserta
+        rows.setdefault(
+            dedup_key,
+            {
+                "user_id": current_user.user_id,
+                "event_id": event.event_id,
+                "scanned_a_last_name": item.get("scanned_a_last_name", ""),
+                "scanned_a_name": item.get("scanned_a_name", ""),
+                "scanned_a_phone": item.get("scanned_a_phone", ""),
+                "scanned_a_email": item.get("scanned_a_email", ""),
+                "scanned_a_company": item.get("scanned_a_company", ""),
+                "scanned_by_rep_name": rep_name,
+                "notes": item.get("notes", ""),
+                "dedup_key": dedup_key,
+                "created_at": created_at,
+                "updated_at": now,
+            },
+        )
+
+    channel = build_records_channel(current_user.company, event.event_id)
+    inserted = {}
+    version = None
+    if rows:
+        inserted = dict(
+            db.session.execute(
+                pg_insert(ExhibitorScan)
+                .values(list(rows.values()))
+                .on_conflict_do_nothing(index_elements=DEDUP_INDEX_ELEMENTS)
+                .returning(ExhibitorScan.dedup_key, ExhibitorScan.e_scan_id)
+            ).all()
+        )
+        if inserted:
+            version = bump_records_version(channel)
+            bump_exhibitor_rollup(
+                event.event_id, current_user.company, contacts=len(inserted)
+            )
+        db.session.commit()
+        publish_exhibitor_scan_deltas(
+            event.event_id, current_user.company, contacts=len(inserted)
+        )
+
+    repeated_keys = set(rows) - set(inserted)
+    existing = {}
+    if repeated_keys:
+        existing = {
+            record.dedup_key: record.to_dict()
+            for record in ExhibitorScan.query.options(
+                joinedload(ExhibitorScan.appointment)
+            ).filter(
+                ExhibitorScan.user_id == current_user.user_id,
+                ExhibitorScan.event_id == event.event_id,
+                ExhibitorScan.dedup_key.in_(repeated_keys),
+            )
+        }
+
+    new_records = {
+        dedup_key: serialize_inserted_record(
+            e_scan_id, rows[dedup_key], current_user.name
+        )
+        for dedup_key, e_scan_id in inserted.items()
+    }
+    reported = set()
+    for result in results:
+        dedup_key = result.pop("dedup_key", None)
+        if dedup_key is None:
+            continue
+        if dedup_key in new_records and dedup_key not in reported:
+            reported.add(dedup_key)
+            result.update({"status": "new", "record": new_records[dedup_key]})
+        else:
+            result.update(
+                {
+                    "status": "repeated",
+                    "record": new_records.get(dedup_key) or existing.get(dedup_key),
+                }
+            )
+
+    if channel and new_records:
+        patch_cached_records(
+            channel,
+            version,
+            created=[
+                (rows[dedup_key]["created_at"], record)
+                for dedup_key, record in new_records.items()
+            ],
+        )
+        publish_records_event(
+            channel,
+            {"type": "records_created", "records": list(new_records.values())},
+        )
+
+    return jsonify(
+        {
+            "result": True,
+            "results": results,
+            "new": len(new_records),
+            "current_user": current_user.company,
+        }
+    )
+
+
 @scan.route("/update-exhibitor-record-notes", methods=["POST"])
 @login_required
 @require_user_type("ADMIN", "EXHIBITOR")
@@ -222,11 +591,15 @@ def update_exhibitor_record_notes():
                 {"success": True, "message": "No se realizaron cambios en las notas"}
             )
         record.notes = notes
-        db.session.commit()
+        record.updated_at = datetime.now()
         channel = build_records_channel(record.user.company, record.event_id)
+        version = bump_records_version(channel)
+        db.session.commit()
         if channel:
+            payload = record.to_dict()
+            patch_cached_records(channel, version, updated=[payload])
             publish_records_event(
-                channel, {"type": "record_updated", "record": record.to_dict()}
+                channel, {"type": "record_updated", "record": payload}
             )
         return jsonify({"success": True, "message": "Notas guardadas exitosamente"})
     else:
@@ -259,7 +632,11 @@ def add_or_update_appointment():
     hour = str(data.get("hour", ""))
     description = str(data.get("description", ""))
 
-    appointment = Appointment.query.filter_by(appointment_id=appointment_id).first()
+    appointment = (
+        Appointment.query.filter_by(appointment_id=appointment_id)
+        .with_for_update()
+        .first()
+    )
     if appointment:
         if (
             str(appointment.date) == date
@@ -272,21 +649,28 @@ def add_or_update_appointment():
                     "appointment": appointment.to_dict(),
                 }
             )
+        _, completed = bump_appointment_counters(
+            appointment.exhibitor_scan.event_id,
+            before=(appointment.date, appointment.status),
+            after=(date, None),
+        )
         appointment.date = date
         appointment.hour = hour
         appointment.description = description
         appointment.status = None
+        appointment.exhibitor_scan.updated_at = datetime.now()
+        event_id = appointment.exhibitor_scan.event_id
+        company = appointment.exhibitor_scan.user.company
+        channel = build_records_channel(company, event_id)
+        version = bump_records_version(channel)
+        bump_exhibitor_rollup(event_id, company, completed=completed)
         db.session.commit()
-        channel = build_records_channel(
-            current_user.company, appointment.exhibitor_scan.event_id
-        )
+        publish_exhibitor_scan_deltas(event_id, company, completed=completed)
         if channel:
+            payload = appointment.exhibitor_scan.to_dict()
+            patch_cached_records(channel, version, updated=[payload])
             publish_records_event(
-                channel,
-                {
-                    "type": "record_updated",
-                    "record": appointment.exhibitor_scan.to_dict(),
-                },
+                channel, {"type": "record_updated", "record": payload}
             )
         return jsonify(
             {
@@ -304,19 +688,32 @@ def add_or_update_appointment():
         location=get_location(),
     )
     db.session.add(new_appt)
-    db.session.commit()
     scan_record = (
-        ExhibitorScan.query.options(joinedload(ExhibitorScan.appointment))
+        ExhibitorScan.query.options(
+            joinedload(ExhibitorScan.appointment), joinedload(ExhibitorScan.user)
+        )
         .filter_by(e_scan_id=e_scan_id)
         .first()
     )
+    channel = None
+    version = None
+    if scan_record:
+        scan_record.updated_at = datetime.now()
+        bump_appointment_counters(scan_record.event_id, after=(date, None))
+        event_id = scan_record.event_id
+        company = scan_record.user.company
+        channel = build_records_channel(company, event_id)
+        version = bump_records_version(channel)
+        bump_exhibitor_rollup(event_id, company, appointments=1)
+    db.session.commit()
 
     if scan_record:
-        channel = build_records_channel(current_user.company, scan_record.event_id)
-        if channel:
-            publish_records_event(
-                channel, {"type": "record_updated", "record": scan_record.to_dict()}
-            )
+        publish_exhibitor_scan_deltas(event_id, company, appointments=1)
+
+    if channel:
+        payload = scan_record.to_dict()
+        patch_cached_records(channel, version, updated=[payload])
+        publish_records_event(channel, {"type": "record_updated", "record": payload})
 
     return jsonify(
         {"message": "Cita agendada correctamente", "appointment": new_appt.to_dict()}
@@ -367,20 +764,31 @@ def update_appointment_status():
     appointment_id = int(data.get("appointment_id", 0))
     status = data.get("status", None)
 
-    appointment = Appointment.query.filter_by(appointment_id=appointment_id).first()
+    appointment = (
+        Appointment.query.filter_by(appointment_id=appointment_id)
+        .with_for_update()
+        .first()
+    )
     if appointment:
+        _, completed = bump_appointment_counters(
+            appointment.exhibitor_scan.event_id,
+            before=(appointment.date, appointment.status),
+            after=(appointment.date, status),
+        )
         appointment.status = status
+        appointment.exhibitor_scan.updated_at = datetime.now()
+        event_id = appointment.exhibitor_scan.event_id
+        company = appointment.exhibitor_scan.user.company
+        channel = build_records_channel(company, event_id)
+        version = bump_records_version(channel)
+        bump_exhibitor_rollup(event_id, company, completed=completed)
         db.session.commit()
-        channel = build_records_channel(
-            current_user.company, appointment.exhibitor_scan.event_id
-        )
+        publish_exhibitor_scan_deltas(event_id, company, completed=completed)
         if channel:
+            payload = appointment.exhibitor_scan.to_dict()
+            patch_cached_records(channel, version, updated=[payload])
             publish_records_event(
-                channel,
-                {
-                    "type": "record_updated",
-                    "record": appointment.exhibitor_scan.to_dict(),
-                },
+                channel, {"type": "record_updated", "record": payload}
             )
         return jsonify({"message": "Estado de la cita actualizado"})
 
@@ -0,0 +1,604 @@
+import heapq
+import json
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from flask import current_app
+from sqlalchemy import and_, case, or_, text
+
+from . import db
+from .events import open_listen_connection, wait_for_notifies
+from .models import QueuedScan
+from .state import (
+    pending_scans,
+    scan_results,
+    pending_order,
+    scan_leases,
+    lease_expirations,
+    lock,
+    wait_for_scan_result,
+    notify_scan_result,
+    wait_for_pending_scans,
+    notify_pending_scans,
+    scan_state_stats,
+    SCAN_STATE_TTL_SECONDS,
+)
+
+SCAN_QUEUE_BACKENDS = ("memory", "postgres", "redis")
+
+
+def _public_scan(scan_id: str, entry: dict):
+    return {
+        "scan_id": scan_id,
+        "vcard": entry["vcard"],
+        "date": entry["date"],
+        "status": entry["status"],
+    }
+
+
+def _new_lease_cursor():
+    return uuid4().hex
+
+
+def _lease_expires_at(lease_seconds: float):
+    return datetime.now() + timedelta(seconds=lease_seconds)
+
+
+class MemoryScanQueue:
+    name = "memory"
+
+    def enqueue(self, scan_id: str, entry: dict):
+        with lock:
+            pending_scans[scan_id] = {**entry, "status": "pending"}
+            pending_order[scan_id] = None
+            notify_pending_scans()
+
+    def pending(self):
+        with lock:
+            scans = []
+            for scan_id in list(pending_order):
+                entry = pending_scans.get(scan_id)
+                if not entry or entry["status"] != "pending":
+                    pending_order.pop(scan_id, None)
+                    continue
+                scans.append(_public_scan(scan_id, entry))
+            return scans
+
+    def _requeue_expired_leases(self, now: float):
+        # Se llama bajo `lock`
+        while lease_expirations and lease_expirations[0][0] <= now:
+            _, cursor = heapq.heappop(lease_expirations)
+            lease = scan_leases.pop(cursor, None)
+            if not lease:
+                continue
+            for scan_id in reversed(lease["scan_ids"]):
+                entry = pending_scans.get(scan_id)
+                if entry and entry["status"] == "leased" and entry["lease"] == cursor:
+                    entry["status"] = "pending"
+                    entry["lease"] = None
+                    pending_order[scan_id] = None
+                    pending_order.move_to_end(scan_id, last=False)
+
+    def lease(self, limit: int, lease_seconds: float):
+        now = time.time()
+        cursor = _new_lease_cursor()
+        scans = []
+        with lock:
+            self._requeue_expired_leases(now)
+            while pending_order and len(scans) < limit:
+                scan_id, _ = pending_order.popitem(last=False)
+                entry = pending_scans.get(scan_id)
+                if not entry or entry["status"] != "pending":
+                    continue
+                entry["status"] = "leased"
+                entry["lease"] = cursor
+                scans.append(_public_scan(scan_id, entry))
+            if scans:
+                scan_leases[cursor] = {"scan_ids": [s["scan_id"] for s in scans]}
+                heapq.heappush(lease_expirations, (now + lease_seconds, cursor))
+        return cursor if scans else None, scans
+
+    def ack(self, cursor: str, scan_ids=None):
+        acked = 0
+        with lock:
+            lease = scan_leases.get(cursor)
+            if not lease:
+                return 0
+            remaining = []
+            for scan_id in lease["scan_ids"]:
+                if scan_ids is not None and scan_id not in scan_ids:
+                    remaining.append(scan_id)
+                    continue
+                entry = pending_scans.get(scan_id)
+                if entry and entry.get("lease") == cursor:
+                    if entry["status"] == "leased":
+                        entry["status"] = "acked"
+                    entry["lease"] = None
+                    acked += 1
+            if remaining:
+                lease["scan_ids"] = remaining
+            else:
+                scan_leases.pop(cursor, None)
+        return acked
+
+    def complete(self, scan_id: str, result: dict):
+        return self.complete_many([(scan_id, result)])[0]
+
+    def complete_many(self, items: list):
+        outcomes = []
+        with lock:
+            for scan_id, result in items:
+                if scan_id not in pending_scans:
+                    outcomes.append((False, None))
+                    continue
+                entry = pending_scans[scan_id]
+                entry["status"] = "done"
+                pending_order.pop(scan_id, None)
+                scan_results[scan_id] = result
+                outcomes.append((True, entry.get("room")))
+        for (scan_id, _), (found, _) in zip(items, outcomes):
+            if found:
+                notify_scan_result(scan_id)
+        return outcomes
+
+    def is_known(self, scan_id: str):
+        with lock:
+            return scan_id in pending_scans
+
+    def get_result(self, scan_id: str):
+        with lock:
+            return scan_results.get(scan_id)
+
+    def wait_for_result(self, scan_id: str, timeout: float):
+        return wait_for_scan_result(scan_id, timeout)
+
+    def wait_for_pending(self, timeout: float):
+        return wait_for_pending_scans(timeout)
+
+    def stats(self):
+        return {"backend": self.name, **scan_state_stats()}
+
+
+class PostgresScanQueue:
+    name = "postgres"
+    notify_channel = "scan_queue"
+    result_notify_channel = "scan_results"
+    cleanup_interval = 60
+
+    def __init__(self, ttl_seconds: int = SCAN_STATE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._last_cleanup = 0.0
+
+    def _cleanup(self):
+        now = time.monotonic()
+        if now - self._last_cleanup < self.cleanup_interval:
+            return
+        self._last_cleanup = now
+        QueuedScan.query.filter(
+            QueuedScan.updated_at < datetime.now() - timedelta(seconds=self.ttl_seconds)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+
+    def enqueue(self, scan_id: str, entry: dict):
+        now = datetime.now()
+        db.session.add(
+            QueuedScan(
+                scan_id=scan_id,
+                vcard=entry["vcard"],
+                date=entry["date"],
+                room=entry.get("room"),
+                status="pending",
+                created_at=now,
+                updated_at=now,
+            )
+        )
+        # NOTIFY se entrega al hacer commit
+        db.session.execute(text(f"NOTIFY {self.notify_channel}"))
+        db.session.commit()
+
+    def pending(self):
+        self._cleanup()
+        # SKIP LOCKED: las filas que otro worker está completando no bloquean
+        rows = (
+            QueuedScan.query.filter(QueuedScan.status == "pending")
+            .order_by(QueuedScan.created_at.asc())
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        scans = [_public_scan(row.scan_id, row.to_dict()) for row in rows]
+        db.session.commit()
+        return scans
+
+    def lease(self, limit: int, lease_seconds: float):
+        now = datetime.now()
+        cursor = _new_lease_cursor()
+        rows = (
+            QueuedScan.query.filter(
+                or_(
+                    QueuedScan.status == "pending",
+                    and_(
+                        QueuedScan.status == "leased",
+                        QueuedScan.lease_expires_at <= now,
+                    ),
+                )
+            )
+            .order_by(QueuedScan.created_at.asc())
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        expires_at = now + timedelta(seconds=lease_seconds)
+        for row in rows:
+            row.status = "leased"
+            row.lease_id = cursor
+            row.lease_expires_at = expires_at
+            row.updated_at = now
+        scans = [_public_scan(row.scan_id, row.to_dict()) for row in rows]
+        db.session.commit()
+        return cursor if scans else None, scans
+
+    def ack(self, cursor: str, scan_ids=None):
+        query = QueuedScan.query.filter(QueuedScan.lease_id == cursor)
+        if scan_ids is not None:
+            query = query.filter(QueuedScan.scan_id.in_(scan_ids))
+        acked = query.update(
+            {
+                QueuedScan.status: case(
+                    (QueuedScan.status == "leased", "acked"),
+                    else_=QueuedScan.status,
+                ),
+                QueuedScan.lease_id: None,
+                QueuedScan.updated_at: datetime.now(),
+            },
+            synchronize_session=False,
+        )
+        db.session.commit()
+        return acked
+
+    def complete(self, scan_id: str, result: dict):
+        return self.complete_many([(scan_id, result)])[0]
+
+    def complete_many(self, items: list):
+        rows = {
+            row.scan_id: row
+            for row in QueuedScan.query.filter(
+                QueuedScan.scan_id.in_({scan_id for scan_id, _ in items})
+            )
+            # Orden fijo de bloqueo para que dos lotes traslapados no se bloqueen
+            .order_by(QueuedScan.scan_id)
+            .with_for_update()
+            .all()
+        }
+        now = datetime.now()
+        outcomes = []
+        for scan_id, result in items:
+            row = rows.get(scan_id)
+            if not row:
+                outcomes.append((False, None))
+                continue
+            row.status = "done"
+            row.result = result
+            row.updated_at = now
+            outcomes.append((True, row.room))
+        done = [scan_id for scan_id, _ in items if scan_id in rows]
+        if done:
+            # Un NOTIFY por escaneo (payload = scan_id), entregados al hacer commit
+            db.session.execute(
+                text("SELECT pg_notify(:channel, scan_id) FROM unnest(:scan_ids) AS scan_id"),
+                {"channel": self.result_notify_channel, "scan_ids": done},
+            )
+        db.session.commit()
+        return outcomes
+
+    def is_known(self, scan_id: str):
+        return (
+            db.session.query(QueuedScan.scan_id)
+            .filter(QueuedScan.scan_id == scan_id)
+            .first()
+            is not None
+        )
+
+    def get_result(self, scan_id: str):
+        row = (
+            db.session.query(QueuedScan.result)
+            .filter(QueuedScan.scan_id == scan_id, QueuedScan.status == "done")
+            .first()
+        )
+        return row.result if row else None
+
+    def _wait_for_notify(self, channel: str, is_ready, timeout: float, payload=None):
+        # Conexión LISTEN propia, fuera del pool, durante toda la espera; se
+        # revisa la tabla después del LISTEN para no perder un NOTIFY intermedio
+        connection = open_listen_connection(channel)
+        try:
+            ready = is_ready()
+            db.session.close()
+            if ready:
+                return True
+            deadline = time.monotonic() + timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                for notify in wait_for_notifies(connection, remaining):
+                    if payload is None or notify.payload == payload:
+                        return True
+        finally:
+            connection.close()
+
+    def wait_for_result(self, scan_id: str, timeout: float):
+        return self._wait_for_notify(
+            self.result_notify_channel,
+            lambda: self.get_result(scan_id) is not None,
+            timeout,
+            payload=scan_id,
+        )
+
+    def _has_pending(self):
+        now = datetime.now()
+        return (
+            db.session.query(QueuedScan.scan_id)
+            .filter(
+                or_(
+                    QueuedScan.status == "pending",
+                    and_(
+                        QueuedScan.status == "leased",
+                        QueuedScan.lease_expires_at <= now,
+                    ),
+                )
+            )
+            .first()
+            is not None
+        )
+
+    def wait_for_pending(self, timeout: float):
+        return self._wait_for_notify(self.notify_channel, self._has_pending, timeout)
+
+    def stats(self):
+        counts = dict(
+            db.session.query(QueuedScan.status, db.func.count())
+            .group_by(QueuedScan.status)
+            .all()
+        )
+        return {"backend": self.name, "entries": counts}
+
+
+class RedisScanQueue:
+    name = "redis"
+    pending_key = "scans:pending"
+    leases_key = "scans:leases"
+    signal_key = "scans:signal"
+
+    def __init__(self, url: str, ttl_seconds: int = SCAN_STATE_TTL_SECONDS):
+        import redis
+
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.ttl_seconds = ttl_seconds
+
+    def _scan_key(self, scan_id: str):
+        return f"scan:{scan_id}"
+
+    def _result_key(self, scan_id: str):
+        return f"scan_result:{scan_id}"
+
+    def _done_channel(self, scan_id: str):
+        return f"scan_done:{scan_id}"
+
+    def _lease_key(self, cursor: str):
+        return f"scan_lease:{cursor}"
+
+    def enqueue(self, scan_id: str, entry: dict):
+        queued_at = time.time()
+        pipe = self.client.pipeline()
+        pipe.hset(
+            self._scan_key(scan_id),
+            mapping={
+                "vcard": entry["vcard"],
+                "date": entry["date"],
+                "room": entry.get("room") or "",
+                "status": "pending",
+                "queued_at": queued_at,
+            },
+        )
+        pipe.expire(self._scan_key(scan_id), self.ttl_seconds)
+        pipe.zadd(self.pending_key, {scan_id: queued_at})
+        pipe.publish(self.signal_key, 1)
+        pipe.execute()
+
+    def pending(self):
+        self.client.zremrangebyscore(
+            self.pending_key, "-inf", time.time() - self.ttl_seconds
+        )
+        scan_ids = self.client.zrange(self.pending_key, 0, -1)
+        if not scan_ids:
+            return []
+        pipe = self.client.pipeline()
+        for scan_id in scan_ids:
+            pipe.hgetall(self._scan_key(scan_id))
+        entries = pipe.execute()
+        return [
+            _public_scan(scan_id, entry)
+            for scan_id, entry in zip(scan_ids, entries)
+            if entry and entry.get("status") == "pending"
+        ]
+
+    def _requeue_expired_leases(self, now: float):
+        for cursor in self.client.zrangebyscore(self.leases_key, "-inf", now):
+            # Sólo el worker que logra quitar el lease lo devuelve a la cola
+            if not self.client.zrem(self.leases_key, cursor):
+                continue
+            lease_key = self._lease_key(cursor)
+            scan_ids = list(self.client.smembers(lease_key))
+            pipe = self.client.pipeline()
+            for scan_id in scan_ids:
+                pipe.hmget(self._scan_key(scan_id), "status", "lease", "queued_at")
+            entries = pipe.execute() if scan_ids else []
+            pipe = self.client.pipeline()
+            for scan_id, (status, lease, queued_at) in zip(scan_ids, entries):
+                if status == "leased" and lease == cursor:
+                    pipe.hset(
+                        self._scan_key(scan_id),
+                        mapping={"status": "pending", "lease": ""},
+                    )
+                    pipe.zadd(self.pending_key, {scan_id: float(queued_at or now)})
+            pipe.delete(lease_key)
+            pipe.execute()
+
+    def lease(self, limit: int, lease_seconds: float):
+        now = time.time()
+        self._requeue_expired_leases(now)
+        popped = self.client.zpopmin(self.pending_key, limit)
+        if not popped:
+            return None, []
+        scan_ids = [scan_id for scan_id, _ in popped]
+        pipe = self.client.pipeline()
+        for scan_id in scan_ids:
+            pipe.hgetall(self._scan_key(scan_id))
+        entries = pipe.execute()
+
+        cursor = _new_lease_cursor()
+        scans = []
+        pipe = self.client.pipeline()
+        for scan_id, entry in zip(scan_ids, entries):
+            if not entry or entry.get("status") != "pending":
+                continue
+            entry["status"] = "leased"
+            pipe.hset(
+                self._scan_key(scan_id),
+                mapping={"status": "leased", "lease": cursor},
+            )
+            scans.append(_public_scan(scan_id, entry))
+        if scans:
+            lease_key = self._lease_key(cursor)
+            pipe.sadd(lease_key, *[scan["scan_id"] for scan in scans])
+            pipe.expire(lease_key, self.ttl_seconds)
+            pipe.zadd(self.leases_key, {cursor: now + lease_seconds})
+        pipe.execute()
+        return cursor if scans else None, scans
+
+    def ack(self, cursor: str, scan_ids=None):
+        lease_key = self._lease_key(cursor)
+        leased_ids = self.client.smembers(lease_key)
+        if scan_ids is not None:
+            leased_ids = leased_ids & set(scan_ids)
+        if not leased_ids:
+            return 0
+        leased_ids = list(leased_ids)
+        pipe = self.client.pipeline()
+        for scan_id in leased_ids:
+            pipe.hmget(self._scan_key(scan_id), "status", "lease")
+        entries = pipe.execute()
+
+        acked = 0
+        pipe = self.client.pipeline()
+        for scan_id, (status, lease) in zip(leased_ids, entries):
+            pipe.srem(lease_key, scan_id)
+            if lease != cursor:
+                continue
+            mapping = {"lease": ""}
+            if status == "leased":
+                mapping["status"] = "acked"
+            pipe.hset(self._scan_key(scan_id), mapping=mapping)
+            acked += 1
+        pipe.execute()
+
+        if not self.client.scard(lease_key):
+            self.client.zrem(self.leases_key, cursor)
+        return acked
+
+    def complete(self, scan_id: str, result: dict):
+        return self.complete_many([(scan_id, result)])[0]
+
+    def complete_many(self, items: list):
+        pipe = self.client.pipeline()
+        for scan_id, _ in items:
+            pipe.hget(self._scan_key(scan_id), "room")
+        rooms = pipe.execute()
+
+        outcomes = []
+        pipe = self.client.pipeline()
+        for (scan_id, result), room in zip(items, rooms):
+            if room is None:
+                outcomes.append((False, None))
+                continue
+            pipe.hset(self._scan_key(scan_id), "status", "done")
+            pipe.zrem(self.pending_key, scan_id)
+            pipe.set(
+                self._result_key(scan_id), json.dumps(result), ex=self.ttl_seconds
+            )
+            # PUBLISH despierta a todos los que esperan este escaneo
+            pipe.publish(self._done_channel(scan_id), 1)
+            outcomes.append((True, room or None))
+        pipe.execute()
+        return outcomes
+
+    def is_known(self, scan_id: str):
+        return bool(self.client.exists(self._scan_key(scan_id)))
+
+    def get_result(self, scan_id: str):
+        raw = self.client.get(self._result_key(scan_id))
+        return json.loads(raw) if raw else None
+
+    def _wait_for_message(self, channel: str, is_ready, timeout: float):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(channel)
+            # Se revisa después de suscribirse para no perder un aviso intermedio
+            if is_ready():
+                return True
+            deadline = time.monotonic() + timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                if pubsub.get_message(timeout=remaining) is not None:
+                    return True
+        finally:
+            pubsub.close()
+
+    def wait_for_result(self, scan_id: str, timeout: float):
+        return self._wait_for_message(
+            self._done_channel(scan_id),
+            lambda: self.get_result(scan_id) is not None,
+            timeout,
+        )
+
+    def _has_pending(self):
+        now = time.time()
+        # Las entradas vencidas ya no tienen hash; no cuentan como pendientes
+        self.client.zremrangebyscore(self.pending_key, "-inf", now - self.ttl_seconds)
+        return bool(
+            self.client.zcard(self.pending_key)
+            or self.client.zcount(self.leases_key, "-inf", now)
+        )
+
+    def wait_for_pending(self, timeout: float):
+        return self._wait_for_message(self.signal_key, self._has_pending, timeout)
+
+    def stats(self):
+        return {
+            "backend": self.name,
+            "pending": self.client.zcard(self.pending_key),
+            "active_leases": self.client.zcard(self.leases_key),
+        }
+
+
+def init_scan_queue(app):
+    backend = app.config.get("SCAN_QUEUE_BACKEND") or "memory"
+    if backend not in SCAN_QUEUE_BACKENDS:
+        raise ValueError(f"SCAN_QUEUE_BACKEND inválido: {backend}")
+
+    if backend == "postgres":
+        queue = PostgresScanQueue()
+    elif backend == "redis":
+        queue = RedisScanQueue(app.config["SCAN_QUEUE_REDIS_URL"])
+    else:
+        queue = MemoryScanQueue()
+
+    app.extensions["scan_queue"] = queue
+    return queue
+
+
+def get_scan_queue():
+    return current_app.extensions["scan_queue"]
@@ -1,13 +1,44 @@
-from flask_socketio import join_room
+import logging
+from flask_socketio import join_room, leave_room, rooms
 from flask_login import current_user
-from flask import g
-from . import socketio
-from .state import build_records_channel
-from .events import set_active_event_for_request
+from flask import current_app, g
+from . import db, socketio
+from .events import open_listen_connection, wait_for_notifies
+from .models import Stats
+from .state import build_records_channel, build_scan_room, build_stats_room, build_user_room, publish_stats_reload
+from .statistics import STATS_NOTIFY_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+stats_listener_started = False
+
+def _listen_for_stats_changes(app):
+    # Reenvía a la página las escrituras de estadísticas hechas fuera de la app
+    while True:
+        try:
+            with app.app_context():
+                connection = open_listen_connection(STATS_NOTIFY_CHANNEL)
+            try:
+                while True:
+                    for notify in wait_for_notifies(connection, 60):
+                        if notify.payload.isdigit():
+                            publish_stats_reload(int(notify.payload))
+            finally:
+                connection.close()
+        except Exception:
+            logger.exception("Se perdió el LISTEN de %s", STATS_NOTIFY_CHANNEL)
+        socketio.sleep(5)
+
+def _start_stats_listener():
+    global stats_listener_started
+    if stats_listener_started:
+        return
+    stats_listener_started = True
+    if db.engine.dialect.name == "postgresql":
+        socketio.start_background_task(_listen_for_stats_changes, current_app._get_current_object())
 
 @socketio.on("connect")
 def handle_connect():
-    set_active_event_for_request()
     active_event = g.get("active_event")
 
     channel =  build_records_channel(
@@ -18,6 +49,37 @@ def handle_connect():
     if channel:
         join_room(channel)
 
+    user_room = build_user_room(current_user.user_id)
+    if user_room:
+        join_room(user_room)
+
+    if current_user.user_type in ("ADMIN", "STAFF"):
+        scan_room = build_scan_room(current_user.user_id)
+        if scan_room:
+            join_room(scan_room)
+
+@socketio.on("join_stats")
+def handle_join_stats(data):
+    if not current_user.is_authenticated or current_user.user_type != "ADMIN":
+        return {"event_id": None}
+
+    # Un admin sigue una sola sede a la vez
+    for room in rooms():
+        if room.startswith("stats|"):
+            leave_room(room)
+
+    try:
+        stats_id = int((data or {}).get("stats_id"))
+    except (TypeError, ValueError):
+        return {"event_id": None}
+    event_id = db.session.execute(
+        db.select(Stats.event_id).where(Stats.stats_id == stats_id)
+    ).scalar()
+    if event_id:
+        _start_stats_listener()
+        join_room(build_stats_room(event_id))
+    return {"event_id": event_id}
+
 @socketio.on("disconnect")
 def handle_disconnect():
     pass
\ No newline at end of file
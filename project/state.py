@@ -1,13 +1,201 @@
-from threading import Lock
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from threading import Lock, Event
 from queue import Queue
 from typing import Optional
+import heapq
+import logging
+import os
+import time
 
-pending_scans = {}
-scan_results = {}
+SCAN_STATE_TTL_SECONDS = int(os.getenv("SCAN_STATE_TTL_SECONDS", 30 * 60))
+SCAN_STATE_MAX_ENTRIES = int(os.getenv("SCAN_STATE_MAX_ENTRIES", 10000))
+RECORDS_PUBLISH_WINDOW_SECONDS = float(os.getenv("RECORDS_PUBLISH_WINDOW_SECONDS", 0.075))
+RECORDS_CACHE_TTL_SECONDS = int(os.getenv("RECORDS_CACHE_TTL_SECONDS", 30 * 60))
+RECORDS_CACHE_MAX_ENTRIES = int(os.getenv("RECORDS_CACHE_MAX_ENTRIES", 200))
+STATS_PUBLISH_WINDOW_SECONDS = float(os.getenv("STATS_PUBLISH_WINDOW_SECONDS", 1))
+
+logger = logging.getLogger(__name__)
+
+
+class ExpiringLRUDict(MutableMapping):
+    # No es thread-safe por sí mismo: se usa siempre bajo `lock`. El TTL se
+    # cuenta desde la última escritura; las lecturas no lo renuevan ni cambian
+    # el orden, así el más antiguo es a la vez el próximo en vencer y en
+    # desalojarse
+    def __init__(self, ttl_seconds: float, max_entries: int, on_remove=None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # Se llama con la llave de cada entrada que expira o se desaloja
+        self.on_remove = on_remove
+        self.evictions = 0
+        self.expirations = 0
+        self._data = OrderedDict()
+
+    def _is_expired(self, written_at: float, now: float):
+        return now - written_at > self.ttl_seconds
+
+    def purge_expired(self):
+        now = time.monotonic()
+        while self._data:
+            key, (written_at, _) = next(iter(self._data.items()))
+            if not self._is_expired(written_at, now):
+                break
+            self._data.popitem(last=False)
+            self.expirations += 1
+            self._removed(key)
+
+    def _removed(self, key):
+        if self.on_remove is not None:
+            self.on_remove(key)
+
+    def __getitem__(self, key):
+        written_at, value = self._data[key]
+        now = time.monotonic()
+        if self._is_expired(written_at, now):
+            del self._data[key]
+            self.expirations += 1
+            self._removed(key)
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.purge_expired()
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            evicted, _ = self._data.popitem(last=False)
+            self.evictions += 1
+            self._removed(evicted)
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def __contains__(self, key):
+        entry = self._data.get(key)
+        return entry is not None and not self._is_expired(entry[0], time.monotonic())
+
+    def __iter__(self):
+        return iter([key for key, _ in self.items()])
+
+    def __len__(self):
+        self.purge_expired()
+        return len(self._data)
+
+    def items(self):
+        now = time.monotonic()
+        return [
+            (key, value)
+            for key, (written_at, value) in self._data.items()
+            if not self._is_expired(written_at, now)
+        ]
+
+    def values(self):
+        return [value for _, value in self.items()]
+
+    def stats(self):
+        return {
+            "live_entries": len(self),
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+# Orden FIFO de los escaneos en estado "pending" y leases activos del servicio;
+# un escaneo que sale de pending_scans también sale de pending_order
+pending_order = OrderedDict()
+pending_scans = ExpiringLRUDict(SCAN_STATE_TTL_SECONDS, SCAN_STATE_MAX_ENTRIES, on_remove=lambda scan_id: pending_order.pop(scan_id, None))
+scan_results = ExpiringLRUDict(SCAN_STATE_TTL_SECONDS, SCAN_STATE_MAX_ENTRIES)
+scan_leases = {}
+lease_expirations = []
+scan_result_waiters = {}
+pending_scans_signal = Event()
 records_clients = {}
+records_outbox = {}
+records_publisher_started = False
+# Listado serializado por canal de registros, validado contra su versión en BD
+records_cache = ExpiringLRUDict(RECORDS_CACHE_TTL_SECONDS, RECORDS_CACHE_MAX_ENTRIES)
+records_cache_hits = 0
+records_cache_misses = 0
+stats_outbox = {}
+stats_publisher_started = False
 
 lock = Lock()
 
+def build_scan_room(user_id: Optional[int]):
+    if not user_id:
+        return None
+    return f"scans|{user_id}"
+
+def build_user_room(user_id: Optional[int]):
+    if not user_id:
+        return None
+    return f"user|{user_id}"
+
+def build_stats_room(event_id: Optional[int]):
+    if not event_id:
+        return None
+    return f"stats|{event_id}"
+
+def scan_state_stats():
+    with lock:
+        return {
+            "pending_scans": pending_scans.stats(),
+            "scan_results": scan_results.stats(),
+            "pending_order": len(pending_order),
+            "active_leases": len(scan_leases),
+            "result_waiters": len(scan_result_waiters),
+        }
+
+def wait_for_scan_result(scan_id: str, timeout: float):
+    # Revisión y registro bajo el mismo `lock` que usa complete_many; todos los
+    # que esperan el mismo escaneo comparten el Event
+    with lock:
+        if scan_id in scan_results:
+            return True
+        waiter = scan_result_waiters.setdefault(scan_id, [Event(), 0])
+        waiter[1] += 1
+    found = waiter[0].wait(timeout)
+    with lock:
+        waiter[1] -= 1
+        if not waiter[1] and scan_result_waiters.get(scan_id) is waiter:
+            scan_result_waiters.pop(scan_id, None)
+    return found
+
+def _has_pending_scans(now: float):
+    # Se llama bajo `lock`: descarta las cabezas obsoletas igual que lease()
+    while pending_order:
+        scan_id = next(iter(pending_order))
+        entry = pending_scans.get(scan_id)
+        if entry and entry["status"] == "pending":
+            return True
+        pending_order.pop(scan_id, None)
+    while lease_expirations and lease_expirations[0][1] not in scan_leases:
+        heapq.heappop(lease_expirations)
+    return bool(lease_expirations) and lease_expirations[0][0] <= now
+
+def wait_for_pending_scans(timeout: float):
+    with lock:
+        if _has_pending_scans(time.time()):
+            return True
+        signal = pending_scans_signal
+    return signal.wait(timeout)
+
+def notify_pending_scans():
+    # Se llama bajo `lock`: despierta a quien espera y deja un evento nuevo
+    global pending_scans_signal
+    signal = pending_scans_signal
+    pending_scans_signal = Event()
+    signal.set()
+
+def notify_scan_result(scan_id: str):
+    with lock:
+        waiter = scan_result_waiters.pop(scan_id, None)
+    if waiter:
+        waiter[0].set()
+
 def build_records_channel(company: str, event_id: Optional[int]):
     if not company or not event_id:
         return None
@@ -28,6 +216,168 @@ def disconnect_records_client(channel: str, client_queue: Queue):
         if not clients and channel in records_clients:
             records_clients.pop(channel, None)
             
+def _split_records_event(event_payload: dict):
+    if event_payload.get("type") == "records_created":
+        return [
+            {"type": "record_created", "record": record}
+            for record in event_payload.get("records", [])
+        ]
+    return [event_payload]
+
+def _records_event_key(event_payload: dict):
+    record = event_payload.get("record") or {}
+    return record.get("e_scan_id", event_payload.get("e_scan_id"))
+
+def _merge_records_event(outbox: OrderedDict, event_payload: dict):
+    # Se llama bajo `lock`: un solo evento por e_scan_id, conservando "created"
+    key = _records_event_key(event_payload)
+    if key is None:
+        outbox[object()] = event_payload
+        return
+    previous = outbox.get(key)
+    if previous and previous.get("type") == "record_created":
+        event_payload = {**event_payload, "type": "record_created"}
+    outbox[key] = event_payload
+
+def _flush_records_events_forever():
+    global records_outbox
+    from . import socketio
+    while True:
+        socketio.sleep(RECORDS_PUBLISH_WINDOW_SECONDS)
+        with lock:
+            outbox, records_outbox = records_outbox, {}
+        for channel, events in outbox.items():
+            try:
+                socketio.emit(
+                    "records_update",
+                    {"type": "batch", "events": list(events.values())},
+                    room=channel,
+                )
+            except Exception:
+                logger.exception("No se pudo publicar records_update en %s", channel)
+
 def publish_records_event(channel: str, event_payload: dict):
+    global records_publisher_started
+    with lock:
+        outbox = records_outbox.setdefault(channel, OrderedDict())
+        for event in _split_records_event(event_payload):
+            _merge_records_event(outbox, event)
+        start_publisher = not records_publisher_started
+        records_publisher_started = True
+    if start_publisher:
+        from . import socketio
+        socketio.start_background_task(_flush_records_events_forever)
+
+def get_cached_records(channel: str, version: int):
+    global records_cache_hits, records_cache_misses
+    with lock:
+        entry = records_cache.get(channel)
+        if entry is None or entry["version"] != version:
+            records_cache_misses += 1
+            return None
+        records_cache_hits += 1
+        items = list(entry["records"].values())
+    items.sort(key=lambda item: item[0])
+    return [record for _, record in items]
+
+def store_cached_records(channel: str, version: int, items: list):
+    # `items` son pares (created_at, registro) en el orden del listado
+    with lock:
+        records_cache[channel] = {
+            "version": version,
+            "records": OrderedDict(
+                (record["e_scan_id"], (created_at, record))
+                for created_at, record in items
+            ),
+        }
+
+def patch_cached_records(channel: str, version: Optional[int], created=(), updated=()):
+    # Aplica el mismo cambio que se publica. Sólo es válido si ninguna otra
+    # escritura ocurrió entre la versión guardada y la que generó este cambio
+    with lock:
+        entry = records_cache.get(channel)
+        if entry is None:
+            return
+        if version is None or entry["version"] != version - 1:
+            records_cache.pop(channel, None)
+            return
+        records = entry["records"]
+        for created_at, record in created:
+            records[record["e_scan_id"]] = (created_at, record)
+        for record in updated:
+            current = records.get(record["e_scan_id"])
+            if current is None:
+                records_cache.pop(channel, None)
+                return
+            records[record["e_scan_id"]] = (current[0], {**current[1], **record})
+        entry["version"] = version
+
+def invalidate_cached_records(event_id: Optional[int] = None):
+    with lock:
+        for channel in list(records_cache):
+            if event_id is None or channel.endswith(f"|{event_id}"):
+                records_cache.pop(channel, None)
+
+def records_cache_stats():
+    with lock:
+        lookups = records_cache_hits + records_cache_misses
+        return {
+            **records_cache.stats(),
+            "hits": records_cache_hits,
+            "misses": records_cache_misses,
+            "hit_ratio": round(records_cache_hits / lookups, 4) if lookups else None,
+        }
+
+def _flush_stats_events_forever():
+    global stats_outbox
     from . import socketio
-    socketio.emit("records_update", event_payload, room=channel)
\ No newline at end of file
+    while True:
+        socketio.sleep(STATS_PUBLISH_WINDOW_SECONDS)
+        with lock:
+            outbox, stats_outbox = stats_outbox, {}
+        for event_id, update in outbox.items():
+            payload = {"event_id": event_id, "stats": update["stats"], "versions": update["versions"], "reload": update["reload"]}
+            payload["exhibitors_scans"] = [
+                {"company": company, "contact_count": contacts, "appt_count": appointments, "completed_appt_count": completed}
+                for company, (contacts, appointments, completed) in update["exhibitors_scans"].items()
+            ]
+            try:
+                socketio.emit("stats_update", payload, room=build_stats_room(event_id))
+            except Exception:
+                logger.exception("No se pudo publicar stats_update de la sede %s", event_id)
+
+def _publish_stats_update(event_id: int, apply):
+    global stats_publisher_started
+    with lock:
+        update = stats_outbox.setdefault(event_id, {"stats": {}, "versions": {}, "exhibitors_scans": {}, "reload": False})
+        apply(update)
+        start_publisher = not stats_publisher_started
+        stats_publisher_started = True
+    if start_publisher:
+        from . import socketio
+        socketio.start_background_task(_flush_stats_events_forever)
+
+def publish_stats_sections(event_id: int, sections: dict, versions: dict):
+    def apply(update):
+        update["stats"].update(sections)
+        update["versions"].update(versions)
+    _publish_stats_update(event_id, apply)
+
+def publish_stats_reload(event_id: Optional[int]):
+    # Cambios que no se pueden expresar como secciones o deltas: la página
+    # vuelve a pedir todo
+    if not event_id:
+        return
+    def apply(update):
+        update["reload"] = True
+    _publish_stats_update(event_id, apply)
+
+def publish_exhibitor_scan_deltas(event_id: Optional[int], company: Optional[str], contacts=0, appointments=0, completed=0):
+    # Los cambios de una misma empresa dentro de la ventana se suman
+    if not event_id or not company or not (contacts or appointments or completed):
+        return
+    key = company.upper()
+    def apply(update):
+        previous = update["exhibitors_scans"].get(key, (0, 0, 0))
+        update["exhibitors_scans"][key] = (previous[0] + contacts, previous[1] + appointments, previous[2] + completed)
+    _publish_stats_update(event_id, apply)
@@ -4,37 +4,41 @@ const companyFilter = document.getElementById("companyFilter");
 const searchInput = document.getElementById("searchInput");
 const allContactsBody = document.getElementById("allContactsBody");
 const exportAllBtn = document.getElementById("exportAllBtn");
+const exportSplitBtn = document.getElementById("exportSplitBtn");
 const purgeBtn = document.getElementById("purgeBtn");
 const activeEventId = document.querySelector("[data-active-event-id]").dataset.activeEventId;
 
+const CONTACTS_PAGE_SIZE = 1000;
 let allRecords = [];
 let selectedEventId = "";
 let selectedEventName = "";
 
-function renderRows() {
-    const selectedCompany = companyFilter.value;
-    const searchTerm = searchInput.value.trim().toLowerCase();
+function matchesFilters(record, selectedCompany, searchTerm) {
+    const matchesCompany = !selectedCompany || record.empresa_expositora === selectedCompany;
 
-    const filtered = allRecords.filter((record) => {
-        const matchesCompany = !selectedCompany || record.empresa_expositora === selectedCompany;
+    const haystack = [
+        record.scanned_a_name,
+        record.scanned_a_last_name,
+        record.scanned_a_email,
+        record.scanned_a_company,
+        record.empresa_expositora,
+    ].join(" ").toLowerCase();
 
-        const haystack = [
-            record.scanned_a_name,
-            record.scanned_a_last_name,
-            record.scanned_a_email,
-            record.scanned_a_company,
-            record.empresa_expositora,
-        ].join(" ").toLowerCase();
+    const matchesSearch = !searchTerm || haystack.includes(searchTerm);
 
-        const matchesSearch = !searchTerm || haystack.includes(searchTerm);
+    return matchesCompany && matchesSearch;
+}
 
-        return matchesCompany && matchesSearch;
-    });
+// Agrega al final de la tabla las filas de `records` que pasan los filtros
+function appendRows(records) {
+    const selectedCompany = companyFilter.value;
+    const searchTerm = searchInput.value.trim().toLowerCase();
+    const fragment = document.createDocumentFragment();
 
-    allContactsBody.innerHTML = "";
+    records.forEach((record) => {
+        if (!matchesFilters(record, selectedCompany, searchTerm)) return;
 
-    filtered.forEach((record) => {
-        const row = allContactsBody.insertRow();
+        const row = document.createElement("tr");
         row.insertCell().textContent = record.empresa_expositora || "N/A";
         row.insertCell().textContent = `${record.scanned_a_last_name || ""} ${record.scanned_a_name || ""}`.trim();
         row.insertCell().textContent = record.scanned_a_email || "N/A";
@@ -43,18 +47,38 @@ function renderRows() {
         row.insertCell().textContent = record.scanned_by_rep_name || record.scanned_by_login || "N/A";
         row.insertCell().textContent = record.day || "N/A";
         row.insertCell().textContent = record.appointment_status || "Sin Cita";
+        fragment.appendChild(row);
     });
+
+    allContactsBody.appendChild(fragment);
 }
 
-function populateCompanyFilter() {
-    const companies = [...new Set(allRecords.map((r) => r.empresa_expositora).filter(Boolean))].sort();
+function renderRows() {
+    allContactsBody.innerHTML = "";
+    appendRows(allRecords);
+}
 
+function resetCompanyFilter() {
     companyFilter.innerHTML = '<option value="">Todas las Empresas Expositoras</option>';
+}
+
+// Inserta en orden sólo las empresas que aún no están en el filtro
+function addCompaniesToFilter(records) {
+    const known = new Set([...companyFilter.options].map((option) => option.value));
+    const companies = [...new Set(records.map((r) => r.empresa_expositora).filter(Boolean))]
+        .filter((company) => !known.has(company))
+        .sort();
+
+    let next = 1;
     companies.forEach((company) => {
+        while (next < companyFilter.options.length && companyFilter.options[next].value < company) {
+            next++;
+        }
         const option = document.createElement("option");
         option.value = company;
         option.textContent = company;
-        companyFilter.appendChild(option);
+        companyFilter.insertBefore(option, companyFilter.options[next] || null);
+        next++;
     });
 }
 
@@ -62,31 +86,59 @@ function loadContactsForEvent(eventId) {
     if (!eventId) {
         allRecords = [];
         allContactsBody.innerHTML = "";
+        resetCompanyFilter();
         activeEventLabel.textContent = "Selecciona una sede para ver sus contactos.";
         exportAllBtn.disabled = true;
+        exportSplitBtn.disabled = true;
         purgeBtn.disabled = true;
         return;
     }
 
-    fetch(`/admin/contacts/list?event_id=${encodeURIComponent(eventId)}`)
+    allRecords = [];
+    allContactsBody.innerHTML = "";
+    resetCompanyFilter();
+    loadContactsPage(eventId, null);
+}
+
+function loadContactsPage(eventId, cursor) {
+    const params = new URLSearchParams({ event_id: eventId, limit: CONTACTS_PAGE_SIZE });
+    if (cursor) {
+        params.set("after", cursor);
+    }
+
+    fetch(`/admin/contacts/list?${params.toString()}`)
         .then((response) => response.json())
         .then((data) => {
+            // Se cambió de sede mientras se cargaban las páginas
+            if (eventId !== selectedEventId) return;
+
             const isActiveEvent = eventId === activeEventId;
 
-            if (data.event) {
-                selectedEventName = `${data.event.location} ${data.event.year}`;
-                activeEventLabel.innerHTML = `<strong>${data.event.total_records} Contactos</strong> para: <strong>${selectedEventName}</strong> (todas las marcas)`;
-                exportAllBtn.disabled = data.event.total_records === 0;
-                purgeBtn.disabled = data.event.total_records === 0 || isActiveEvent;
-                purgeBtn.title = isActiveEvent ? "No puedes purgar la sede activa" : "";
-            } else {
-                activeEventLabel.textContent = "No se encontró esa sede.";
-                exportAllBtn.disabled = true;
-                purgeBtn.disabled = true;
+            if (!cursor) {
+                if (data.event) {
+                    selectedEventName = `${data.event.location} ${data.event.year}`;
+                    activeEventLabel.innerHTML = `<strong>${data.event.total_records} Contactos</strong> para: <strong>${selectedEventName}</strong> (todas las marcas)`;
+                    exportAllBtn.disabled = data.event.total_records === 0;
+                    exportSplitBtn.disabled = data.event.total_records === 0;
+                    purgeBtn.disabled = data.event.total_records === 0 || isActiveEvent;
+                    purgeBtn.title = isActiveEvent ? "No puedes purgar la sede activa" : "";
+                } else {
+                    activeEventLabel.textContent = "No se encontró esa sede.";
+                    exportAllBtn.disabled = true;
+                    exportSplitBtn.disabled = true;
+                    purgeBtn.disabled = true;
+                }
+            }
+
+            // Cada página sólo agrega sus filas y empresas; no se redibuja lo ya cargado
+            const records = data.records || [];
+            allRecords.push(...records);
+            addCompaniesToFilter(records);
+            appendRows(records);
+
+            if (data.next_cursor) {
+                loadContactsPage(eventId, data.next_cursor);
             }
-            allRecords = data.records || [];
-            populateCompanyFilter();
-            renderRows();
         });
 }
 
@@ -98,9 +150,27 @@ eventSelector.addEventListener("change", () => {
 companyFilter.addEventListener("change", renderRows);
 searchInput.addEventListener("input", renderRows);
 
-exportAllBtn.addEventListener("click", () => {
+exportAllBtn.addEventListener("click", async () => {
+    if (!selectedEventId) return;
+
+    exportAllBtn.disabled = true;
+    try {
+        await runExportJob("/admin/contacts/export", { event_id: Number(selectedEventId) });
+    } catch (err) {
+        await Swal.fire({
+            theme: "dark",
+            title: "<strong>ERROR</strong>",
+            text: "Descarga fallida " + err.message,
+            icon: "error"
+        });
+    } finally {
+        exportAllBtn.disabled = false;
+    }
+});
+
+exportSplitBtn.addEventListener("click", () => {
     if (!selectedEventId) return;
-    window.location.href = `/admin/contacts/export?event_id=${encodeURIComponent(selectedEventId)}`;
+    window.location.href = `/admin/contacts/export-split?event_id=${encodeURIComponent(selectedEventId)}`;
 });
 
 purgeBtn.addEventListener("click", async () => {
@@ -0,0 +1,92 @@
+const EXPORT_STATUS_POLL_MS = 3000;
+
+function exportProgressText(job) {
+    if (job.status === "queued") return "En cola...";
+    if (!job.total) return "Generando archivo...";
+    const processed = Math.min(job.processed || 0, job.total);
+    return `Procesando ${processed} de ${job.total} contactos`;
+}
+
+function waitForExportJob(job, onProgress) {
+    if (job.status === "ready") return Promise.resolve(job);
+
+    return new Promise((resolve, reject) => {
+        let socket = null;
+        let pollTimeout = null;
+        let finished = false;
+
+        const finish = (error, result) => {
+            if (finished) return;
+            finished = true;
+            if (socket) socket.disconnect();
+            if (pollTimeout) clearTimeout(pollTimeout);
+            error ? reject(error) : resolve(result);
+        };
+
+        const handle = (update) => {
+            if (!update || update.job_id !== job.job_id) return;
+            if (update.status === "ready") {
+                finish(null, update);
+            } else if (update.status === "error") {
+                finish(new Error(update.error || "Ocurrió un error al exportar"));
+            } else {
+                onProgress(update);
+            }
+        };
+
+        // El socket avisa el avance; el sondeo cubre la falta de socket y un
+        // trabajo que terminó antes de conectarse
+        const poll = () => {
+            fetch(`/exports/${encodeURIComponent(job.job_id)}`)
+                .then(response => response.ok ? response.json() : null)
+                .then(update => {
+                    if (update) handle(update);
+                })
+                .catch(() => {})
+                .finally(() => {
+                    if (!finished) pollTimeout = setTimeout(poll, EXPORT_STATUS_POLL_MS);
+                });
+        };
+
+        if (typeof io !== "undefined") {
+            socket = io({ transports: ["websocket"] });
+            socket.on("export_progress", handle);
+        }
+        pollTimeout = setTimeout(poll, EXPORT_STATUS_POLL_MS);
+    });
+}
+
+async function runExportJob(url, payload) {
+    const response = await fetch(url, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(payload || {})
+    });
+    const job = await response.json().catch(() => ({}));
+
+    if (!response.ok) {
+        throw new Error(job.error || "Ocurrió un error al exportar");
+    }
+
+    Swal.fire({
+        theme: "dark",
+        title: "<strong>EXPORTANDO</strong>",
+        text: exportProgressText(job),
+        allowOutsideClick: false,
+        didOpen: () => Swal.showLoading()
+    });
+
+    await waitForExportJob(job, (update) => {
+        const container = Swal.getHtmlContainer();
+        if (container) container.textContent = exportProgressText(update);
+    });
+
+    window.location.href = `/exports/${encodeURIComponent(job.job_id)}/download`;
+
+    await Swal.fire({
+        theme: "dark",
+        title: "<strong>ÉXITO</strong>",
+        text: "Descarga completada exitosamente",
+        icon: "success"
+    });
+}
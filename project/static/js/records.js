@@ -1,6 +1,7 @@
 const recordsContainer = document.getElementById("recordsContainer");
 const activeEventLabel = document.getElementById("activeEventLabel");
 let records;
+let recordsSyncCursor = null;
 let eventName;
 let c_user;
 let canEditRecords = false;
@@ -382,19 +383,38 @@ async function updateNotes(e_scan_id, notes) {
 }
 
 function loadRecords() {
-    fetch("/exhibitor-records", {
-        method: "POST",
-        headers: {
-            "Content-Type": "application/json",
-        },
-        body: JSON.stringify({}),
-    })
+    // La primera carga es un GET que el navegador revalida con su ETag; después
+    // sólo se piden los cambios desde el cursor
+    const request = records && recordsSyncCursor
+        ? fetch("/exhibitor-records", {
+            method: "POST",
+            headers: {
+                "Content-Type": "application/json",
+            },
+            body: JSON.stringify({ since: recordsSyncCursor }),
+        })
+        : fetch("/exhibitor-records/list");
+
+    request
         .then((response) => response.json())
         .then((data) => {
             c_user = data.current_user;
             canEditRecords = Boolean(data.is_editable_window);
+            recordsSyncCursor = data.next_cursor;
+
+            if (data.is_delta) {
+                const deletedIds = new Set(data.deleted || []);
+                records = records.filter((r) => !deletedIds.has(r.e_scan_id));
+                const indexById = recordsIndex();
+                data.records.forEach((record) => upsertRecord(indexById, record));
+                if (data.event) {
+                    data.event.total_records = records.length;
+                }
+            } else {
+                records = data.records;
+            }
+
             updateEventLabel(data.event);
-            records = data.records;
             renderRecords();
             if (data.event && data.event.is_editable_window && !recordsStream) {
                 startRecordsStream();
@@ -402,18 +422,50 @@ function loadRecords() {
         });
 }
 
-function insertNewRecord(record) {
-    records.push(record);
-    renderRecords();
+function recordsIndex() {
+    return new Map(records.map((r, index) => [r.e_scan_id, index]));
 }
 
-function updateSingleRecord(updatedRecord) {
-    const index = records.findIndex(r => r.e_scan_id === updatedRecord.e_scan_id);
+function upsertRecord(indexById, record) {
+    const index = indexById.get(record.e_scan_id);
+
+    if (index === undefined) {
+        indexById.set(record.e_scan_id, records.length);
+        records.push(record);
+    } else {
+        records[index] = { ...records[index], ...record };
+    }
+}
 
-    if (index === -1) return;
+// Aplica todos los eventos de un lote sobre un índice por e_scan_id y avisa si
+// hay que volver a pintar; la tabla se pinta una sola vez por lote
+function applyRecordsEvents(events) {
+    const indexById = recordsIndex();
+    let changed = false;
 
-    records[index] = updatedRecord;
-    renderRecords();
+    const upsert = (record) => {
+        upsertRecord(indexById, record);
+        changed = true;
+    };
+
+    events.forEach((event) => {
+        if (!event) return;
+
+        if (event.type === "record_created" && event.record) {
+            upsert(event.record);
+        } else if (event.type === "records_created") {
+            (event.records || []).forEach(upsert);
+        } else if (event.type === "record_updated" && event.record) {
+            const record = event.record;
+            if (hasPendingNotesForRecord(record.e_scan_id)) {
+                pendingRemoteRecordIds.add(record.e_scan_id);
+            } else if (indexById.has(record.e_scan_id)) {
+                upsert(record);
+            }
+        }
+    });
+
+    return changed;
 }
 
 function hasPendingLocalChanges() {
@@ -440,20 +492,10 @@ function startRecordsStream() {
     recordsStream.on("records_update", (payload) => {
         if (!payload) return;
 
-        if (payload.type === "record_created") {
-            insertNewRecord(payload.record);
-            return;
-        }
+        const events = payload.type === "batch" ? (payload.events || []) : [payload];
 
-        if (payload.type === "record_updated") {
-            const record = payload.record;
-
-            if (hasPendingNotesForRecord(record.e_scan_id)) {
-                pendingRemoteRecordIds.add(record.e_scan_id);
-                return;
-            }
-
-            updateSingleRecord(record);
+        if (applyRecordsEvents(events)) {
+            renderRecords();
         }
     });
 
@@ -492,46 +534,16 @@ async function exportRecords() {
         return;
     }
 
-    fetch("/export-records")
-        .then(async response => {
-            if (!response.ok) {
-                const err = await response.json().catch(() => ({}));
-
-                await Swal.fire({
-                    theme: "dark",
-                    title: "<strong>ERROR</strong>",
-                    text: err.error || "Ocurrió un error al exportar",
-                    icon: "error"
-                });
-                return;
-            }
-            return response.blob();
-        })
-        .then(blob => {
-            const downloadUrl = window.URL.createObjectURL(blob);
-            const a = document.createElement("a");
-            a.href = downloadUrl;
-            a.download = `Contactos CMC ${eventName}`;
-            document.body.appendChild(a);
-            a.click();
-            a.remove();
-            window.URL.revokeObjectURL(downloadUrl);
-
-            Swal.fire({
-                theme: "dark",
-                title: "<strong>ÉXITO</strong>",
-                text: "Descarga completada exitosamente",
-                icon: "success"
-            });
-        })
-        .catch(err => {
-            Swal.fire({
-                theme: "dark",
-                title: "<strong>ERROR</strong>",
-                text: "Descarga fallida " + err.message,
-                icon: "error"
-            });
+    try {
+        await runExportJob("/export-records");
+    } catch (err) {
+        await Swal.fire({
+            theme: "dark",
+            title: "<strong>ERROR</strong>",
+            text: "Descarga fallida " + err.message,
+            icon: "error"
         });
+    }
 }
 
 async function downloadAndShareAppointment(record) {
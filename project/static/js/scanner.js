@@ -6,7 +6,131 @@ let c_user;
 
 const config = { fps: 30, qrbox: document.getElementById("camera-container").offsetWidth };
 let isScanning = false;
-let pollingInterval = null;
+let currentScanId = null;
+let scanFallbackTimeout = null;
+let longPollingScanId = null;
+const pushedScanResults = {};
+const SCAN_STATUS_WAIT_SECONDS = 20;
+const SCAN_PUSH_FALLBACK_MS = 5000;
+// Pausa mínima entre consultas de estado y tope del retroceso cuando el
+// servidor no conoce el escaneo (el resultado puede llegar por socket)
+const SCAN_STATUS_MIN_INTERVAL_MS = 1000;
+const SCAN_STATUS_UNKNOWN_MAX_BACKOFF_MS = 15000;
+let scanSocket = null;
+
+if (window.location.pathname === "/scanner" && typeof io !== "undefined") {
+    scanSocket = io({
+        transports: ["websocket"]
+    });
+
+    scanSocket.on("scan_result", (payload) => {
+        if (!payload || !payload.scan_id) return;
+
+        if (payload.scan_id === currentScanId) {
+            resolveScan(payload.scan_id, payload);
+        } else {
+            pushedScanResults[payload.scan_id] = payload;
+        }
+    });
+
+    scanSocket.on("connect", () => {
+        if (currentScanId) {
+            waitForScanStatus(currentScanId);
+        }
+    });
+}
+
+const OFFLINE_SCANS_KEY = "pendingExhibitorScans";
+const OFFLINE_SYNC_INTERVAL_MS = 30000;
+// Igual que EXHIBITOR_SCAN_BATCH_MAX_ITEMS en el servidor
+const OFFLINE_SYNC_BATCH_SIZE = 200;
+let isSyncingOfflineScans = false;
+
+function newIdempotencyKey() {
+    return (crypto.randomUUID && crypto.randomUUID()) || `${Date.now()}-${Math.random()}`;
+}
+
+function getOfflineExhibitorScans() {
+    let scans;
+    try {
+        scans = JSON.parse(localStorage.getItem(OFFLINE_SCANS_KEY)) || [];
+    } catch (err) {
+        return [];
+    }
+    // Escaneos guardados antes de que la cola usara llaves
+    if (scans.some((scan) => !scan.idempotency_key)) {
+        scans.forEach((scan) => {
+            scan.idempotency_key = scan.idempotency_key || newIdempotencyKey();
+        });
+        saveOfflineExhibitorScans(scans);
+    }
+    return scans;
+}
+
+function saveOfflineExhibitorScans(scans) {
+    if (scans.length) {
+        localStorage.setItem(OFFLINE_SCANS_KEY, JSON.stringify(scans));
+    } else {
+        localStorage.removeItem(OFFLINE_SCANS_KEY);
+    }
+}
+
+function queueOfflineExhibitorScan(attendee) {
+    const scans = getOfflineExhibitorScans();
+    scans.push({
+        ...attendee,
+        idempotency_key: newIdempotencyKey(),
+        scanned_at: new Date().toISOString()
+    });
+    saveOfflineExhibitorScans(scans);
+}
+
+async function syncOfflineExhibitorScans() {
+    if (isSyncingOfflineScans || !navigator.onLine) return;
+
+    isSyncingOfflineScans = true;
+    let synced = 0;
+    try {
+        // Lotes del tamaño que acepta el servidor hasta vaciar la cola. Otra
+        // pestaña puede compartir la cola: sólo se quitan las llaves confirmadas
+        while (true) {
+            const scans = getOfflineExhibitorScans().slice(0, OFFLINE_SYNC_BATCH_SIZE);
+            if (!scans.length) break;
+
+            const response = await fetch("/exhibitor-scan/batch", {
+                method: "POST",
+                headers: { "Content-Type": "application/json" },
+                body: JSON.stringify({ scans })
+            });
+            if (!response.ok) break;
+
+            const data = await response.json();
+            const processed = new Set(
+                (data.results || []).map((r) => r.idempotency_key).filter(Boolean)
+            );
+            if (!processed.size) break;
+            saveOfflineExhibitorScans(
+                getOfflineExhibitorScans().filter((scan) => !processed.has(scan.idempotency_key))
+            );
+            synced += data.new || 0;
+        }
+    } catch (err) {
+        // Sin conexión todavía: se reintenta en el siguiente ciclo
+    } finally {
+        isSyncingOfflineScans = false;
+    }
+
+    if (synced) {
+        message.style.color = "#000";
+        message.textContent = `${synced} contacto(s) sin conexión sincronizado(s)`;
+    }
+}
+
+if (window.location.pathname === "/exhibitor-scanner") {
+    window.addEventListener("online", syncOfflineExhibitorScans);
+    setInterval(syncOfflineExhibitorScans, OFFLINE_SYNC_INTERVAL_MS);
+    syncOfflineExhibitorScans();
+}
 
 function extractLastNameAndName(text) {
     const parts = text.slice(2).split(";");
@@ -70,9 +194,8 @@ async function onQrScanned(decodedText, decodedResult) {
     await track.stop();
     await scanner.stop();
 
-    if (pollingInterval) {
-        clearInterval(pollingInterval);
-    }
+    currentScanId = null;
+    clearTimeout(scanFallbackTimeout);
     let response;
     const endpoint = window.location.pathname;
 
@@ -100,9 +223,17 @@ async function onQrScanned(decodedText, decodedResult) {
 
         const { scan_id } = await response.json();
 
-        pollingInterval = setInterval(() => {
-            checkScanStatus(scan_id);
-        }, 1000);
+        currentScanId = scan_id;
+
+        if (pushedScanResults[scan_id]) {
+            resolveScan(scan_id, pushedScanResults[scan_id]);
+        } else if (scanSocket && scanSocket.connected) {
+            scanFallbackTimeout = setTimeout(() => {
+                waitForScanStatus(scan_id);
+            }, SCAN_PUSH_FALLBACK_MS);
+        } else {
+            waitForScanStatus(scan_id);
+        }
 
     } else if (endpoint === "/exhibitor-scanner") {
         let attendee;
@@ -143,11 +274,27 @@ async function onQrScanned(decodedText, decodedResult) {
 
             if (firstResult.isConfirmed) {
 
-                const response = await fetch("/exhibitor-scan", {
-                    method: "POST",
-                    headers: { "Content-Type": "application/json" },
-                    body: JSON.stringify(attendee)
-                });
+                let response;
+                try {
+                    response = await fetch("/exhibitor-scan", {
+                        method: "POST",
+                        headers: { "Content-Type": "application/json" },
+                        body: JSON.stringify(attendee)
+                    });
+                } catch (networkError) {
+                    queueOfflineExhibitorScan(attendee);
+                    await Swal.fire({
+                        theme: "dark",
+                        title: "<strong>SIN CONEXIÓN</strong>",
+                        text: "El contacto se guardará automáticamente al recuperar la conexión",
+                        icon: "info"
+                    });
+                    isScanning = true;
+                    zoomSlider.disabled = false;
+                    await scanner.start({ facingMode: { exact: "environment" } }, config, onQrScanned);
+                    await restartScanner();
+                    return;
+                }
 
                 const data = await response.json().catch(() => ({}));
 
@@ -193,16 +340,54 @@ async function onQrScanned(decodedText, decodedResult) {
     }
 }
 
-async function checkScanStatus(scanId) {
-    const response = await fetch(`/scan-status/${scanId}`);
-    const data = await response.json();
+async function waitForScanStatus(scanId) {
+    if (longPollingScanId === scanId) return;
+    longPollingScanId = scanId;
 
-    if (data.status === "pending") {
-        return;
+    let unknownBackoff = SCAN_STATUS_MIN_INTERVAL_MS;
+    try {
+        while (currentScanId === scanId) {
+            const startedAt = Date.now();
+            let delay = SCAN_STATUS_MIN_INTERVAL_MS;
+            try {
+                const response = await fetch(`/scan-status/${scanId}?wait=${SCAN_STATUS_WAIT_SECONDS}`);
+                const data = await response.json();
+
+                if (data.status === "unknown") {
+                    delay = unknownBackoff;
+                    unknownBackoff = Math.min(unknownBackoff * 2, SCAN_STATUS_UNKNOWN_MAX_BACKOFF_MS);
+                } else if (data.status !== "pending") {
+                    resolveScan(scanId, data);
+                    break;
+                } else {
+                    unknownBackoff = SCAN_STATUS_MIN_INTERVAL_MS;
+                }
+            } catch (err) {
+                // Error de red o respuesta inválida: se reintenta tras la pausa mínima
+            }
+
+            const remaining = delay - (Date.now() - startedAt);
+            if (remaining > 0) {
+                await new Promise((resolve) => setTimeout(resolve, remaining));
+            }
+        }
+    } finally {
+        if (longPollingScanId === scanId) {
+            longPollingScanId = null;
+        }
     }
+}
+
+function resolveScan(scanId, data) {
+    if (scanId !== currentScanId) return;
 
-    clearInterval(pollingInterval);
+    currentScanId = null;
+    clearTimeout(scanFallbackTimeout);
+    delete pushedScanResults[scanId];
+    showScanResult(data);
+}
 
+async function showScanResult(data) {
     if (!data.result) {
         await Swal.fire({
             theme: "dark",
@@ -22,8 +22,15 @@ const tableMap = {
     speakerStats: [speakersGeneralTable, speakersTable]
 };
 
+const STATS_FALLBACK_POLL_MS = 60000 * 15;
+// Cada worker puede avisar la misma recarga: se agrupan en una sola petición
+const STATS_RELOAD_DEBOUNCE_MS = 2000;
+
 let lastStats = {};
 let lastExhibitorScansStats = {};
+let statsSocket = null;
+let statsEventId = null;
+let statsReloadTimer = null;
 
 statsSelector.addEventListener('change', updateData);
 
@@ -65,8 +72,167 @@ function isEmpty(obj) {
     throw new TypeError("Expected a plain object")
 }
 
+function renderStats(stats) {
+    var attendees = stats.attendees_scan_stats || [];
+    var exhibitors = stats.exhibitor_scan_stats || [];
+    var speakers = stats.speakers_scan_stats || [];
+
+    attendeesTable.querySelector("tbody").innerHTML = "";
+    for (let nAttendee = 0; nAttendee < attendees.length; nAttendee++) {
+        const newRow = attendeesTable.tBodies[0].insertRow();
+        const idCell = newRow.insertCell();
+        const agentCell = newRow.insertCell();
+        const lastnameCell = newRow.insertCell();
+        const nameCell = newRow.insertCell();
+        const companyCell = newRow.insertCell();
+        const typeCell = newRow.insertCell();
+        const scholarshipCell = newRow.insertCell();
+        const day1Cell = newRow.insertCell();
+        const day2Cell = newRow.insertCell();
+        const day3Cell = newRow.insertCell();
+        const day4Cell = newRow.insertCell();
+
+        idCell.textContent = attendees[nAttendee].ID;
+        agentCell.textContent = attendees[nAttendee].Agente;
+        lastnameCell.textContent = attendees[nAttendee]["Apellido(s)"];
+        nameCell.textContent = attendees[nAttendee]["Nombre(s)"];
+        companyCell.textContent = attendees[nAttendee].Empresa;
+        typeCell.textContent = attendees[nAttendee]["Tipo de Asistente"];
+        scholarshipCell.textContent = attendees[nAttendee].Beca;
+        day1Cell.textContent = attendees[nAttendee]["Día 1"];
+        day2Cell.textContent = attendees[nAttendee]["Día 2"];
+        day3Cell.textContent = attendees[nAttendee]["Día 3"];
+        day4Cell.textContent = attendees[nAttendee]["Día 4"];
+
+    }
+
+    const exGeneralRow = exhibitorGeneralTable.tBodies[0].rows[0];
+    exGeneralRow.cells[0].textContent = stats.total_exhibitors;
+    exGeneralRow.cells[1].textContent = stats.daily_exhibitor_stats.day_3.actual;
+    exGeneralRow.cells[2].textContent = stats.daily_exhibitor_stats.day_4.actual;
+
+    exhibitorsTable.querySelector("tbody").innerHTML = "";
+    for (let nExhibitor = 0; nExhibitor < exhibitors.length; nExhibitor++) {
+        const newRow = exhibitorsTable.tBodies[0].insertRow();
+        const idCell = newRow.insertCell();
+        const lastnameCell = newRow.insertCell();
+        const nameCell = newRow.insertCell();
+        const companyCell = newRow.insertCell();
+        const typeCell = newRow.insertCell();
+        const day3Cell = newRow.insertCell();
+        const day4Cell = newRow.insertCell();
+
+        idCell.textContent = exhibitors[nExhibitor].ID;
+        lastnameCell.textContent = exhibitors[nExhibitor]["Apellido(s)"];
+        nameCell.textContent = exhibitors[nExhibitor]["Nombre(s)"];
+        companyCell.textContent = exhibitors[nExhibitor].Empresa;
+        typeCell.textContent = exhibitors[nExhibitor].Tipo;
+        day3Cell.textContent = exhibitors[nExhibitor]["Día 3"];
+        day4Cell.textContent = exhibitors[nExhibitor]["Día 4"];
+
+    }
+
+    const spGeneralRow = speakersGeneralTable.tBodies[0].rows[0];
+    spGeneralRow.cells[0].textContent = stats.total_speakers;
+    spGeneralRow.cells[1].textContent = stats.daily_speaker_stats.day_1.actual;
+    spGeneralRow.cells[2].textContent = stats.daily_speaker_stats.day_2.actual;
+    spGeneralRow.cells[3].textContent = stats.daily_speaker_stats.day_3.actual;
+    spGeneralRow.cells[4].textContent = stats.daily_speaker_stats.day_4.actual;
+
+    speakersTable.querySelector("tbody").innerHTML = "";
+    for (let nSpeaker = 0; nSpeaker < speakers.length; nSpeaker++) {
+        const newRow = speakersTable.tBodies[0].insertRow();
+        const idCell = newRow.insertCell();
+        const lastnameCell = newRow.insertCell();
+        const nameCell = newRow.insertCell();
+        const companyCell = newRow.insertCell();
+        const typeCell = newRow.insertCell();
+        const day1Cell = newRow.insertCell();
+        const day2Cell = newRow.insertCell();
+        const day3Cell = newRow.insertCell();
+        const day4Cell = newRow.insertCell();
+
+        idCell.textContent = speakers[nSpeaker].ID;
+        lastnameCell.textContent = speakers[nSpeaker]["Apellido(s)"];
+        nameCell.textContent = speakers[nSpeaker]["Nombre(s)"];
+        companyCell.textContent = speakers[nSpeaker].Empresa;
+        typeCell.textContent = speakers[nSpeaker].Tipo;
+        day1Cell.textContent = speakers[nSpeaker]["Día 1"];
+        day2Cell.textContent = speakers[nSpeaker]["Día 2"];
+        day3Cell.textContent = speakers[nSpeaker]["Día 3"];
+        day4Cell.textContent = speakers[nSpeaker]["Día 4"];
+
+    }
+
+    const generalRow = generalTable.tBodies[0].rows[0];
+    generalRow.cells[0].textContent = stats.total_attendees;
+    generalRow.cells[1].textContent = stats.type_stats.combo;
+    generalRow.cells[2].textContent = stats.type_stats.sessions;
+    generalRow.cells[3].textContent = stats.type_stats.courses;
+    generalRow.cells[4].textContent = stats.type_stats.general;
+    generalRow.cells[5].textContent = stats.scholarship_stats.total_scholarship_holders;
+    generalRow.cells[6].textContent = stats.scholarship_stats.combo_scholarship_holders;
+    generalRow.cells[7].textContent = stats.scholarship_stats.sessions_scholarship_holders;
+    generalRow.cells[8].textContent = stats.scholarship_stats.courses_scholarship_holders;
+    generalRow.cells[9].textContent = stats.scholarship_stats.general_scholarship_holders;
+
+    const generalRow1 = generalTable1.tBodies[0].rows[0];
+    generalRow1.cells[0].textContent = stats.total_scanned_attendees;
+    generalRow1.cells[1].textContent = stats.scanned_scholarship_holders.total;
+    generalRow1.cells[2].textContent = stats.scanned_attendees_by_type.combo;
+    generalRow1.cells[3].textContent = stats.scanned_attendees_by_type.sessions;
+    generalRow1.cells[4].textContent = stats.scanned_attendees_by_type.courses;
+    generalRow1.cells[5].textContent = stats.scanned_attendees_by_type.general;
+    generalRow1.cells[6].textContent = stats.scanned_scholarship_holders.combo;
+    generalRow1.cells[7].textContent = stats.scanned_scholarship_holders.sessions;
+    generalRow1.cells[8].textContent = stats.scanned_scholarship_holders.courses;
+    generalRow1.cells[9].textContent = stats.scanned_scholarship_holders.general;
+
+    dailyTable.querySelector("tbody").innerHTML = "";
+
+    for (let day = 1; day <= 4; day++) {
+        const newRow = dailyTable.tBodies[0].insertRow();
+        const dayCell = newRow.insertCell();
+        const comboCell = newRow.insertCell();
+        const coursesCell = newRow.insertCell();
+        const sessionsCell = newRow.insertCell();
+        const generalCell = newRow.insertCell();
+        const eTotalCell = newRow.insertCell();
+        const totalCell = newRow.insertCell();
+        const scholarshipsCell = newRow.insertCell();
+
+        dayCell.textContent = `Día ${day}`;
+        comboCell.textContent = stats.daily_attendee_type_scans[`day_${day}`].combo;
+        coursesCell.textContent = stats.daily_attendee_type_scans[`day_${day}`].courses;
+        sessionsCell.textContent = stats.daily_attendee_type_scans[`day_${day}`].sessions;
+        generalCell.textContent = stats.daily_attendee_type_scans[`day_${day}`].general;
+        eTotalCell.textContent = stats.daily_stats[`day_${day}`].expected;
+        totalCell.textContent = stats.daily_stats[`day_${day}`].actual_count;
+        scholarshipsCell.textContent = stats.daily_scanned_sh[`day_${day}`];
+    }
+}
+
+function renderExhibitorScans(rows) {
+    exhibitorScansTable.querySelector("tbody").innerHTML = "";
+    for (let nExhibitorCompany = 0; nExhibitorCompany < rows.length; nExhibitorCompany++) {
+        const newRow = exhibitorScansTable.tBodies[0].insertRow();
+        const idCell = newRow.insertCell();
+        const companyCell = newRow.insertCell();
+        const contactCountCell = newRow.insertCell();
+        const apptCountCell = newRow.insertCell();
+        const completedApptCountCell = newRow.insertCell();
+
+        idCell.textContent = nExhibitorCompany + 1;
+        companyCell.textContent = rows[nExhibitorCompany].company;
+        contactCountCell.textContent = rows[nExhibitorCompany].contact_count;
+        apptCountCell.textContent = rows[nExhibitorCompany].appt_count;
+        completedApptCountCell.textContent = rows[nExhibitorCompany].completed_appt_count;
+    }
+}
+
 function updateData() {
     var selection = statsSelector.value;
+    joinStatsRoom(selection);
 
     fetch('/statistics', {
         method: "POST",
@@ -78,171 +244,81 @@ function updateData() {
         .then(response => response.json())
         .then(data => {
             if (!isEmpty(data)) {
-
-                let stats = data.stats;
-                let exhibitorScansStats = data.exhibitors_scans;
-
-                if (!isEqual(stats, lastStats)) {
-                    var attendees = stats.attendees_scan_stats;
-                    var exhibitors = stats.exhibitor_scan_stats;
-                    var speakers = stats.speakers_scan_stats;
-
-                    attendeesTable.querySelector("tbody").innerHTML = "";
-                    for (let nAttendee = 0; nAttendee < attendees.length; nAttendee++) {
-                        const newRow = attendeesTable.tBodies[0].insertRow();
-                        const idCell = newRow.insertCell();
-                        const agentCell = newRow.insertCell();
-                        const lastnameCell = newRow.insertCell();
-                        const nameCell = newRow.insertCell();
-                        const companyCell = newRow.insertCell();
-                        const typeCell = newRow.insertCell();
-                        const scholarshipCell = newRow.insertCell();
-                        const day1Cell = newRow.insertCell();
-                        const day2Cell = newRow.insertCell();
-                        const day3Cell = newRow.insertCell();
-                        const day4Cell = newRow.insertCell();
-
-                        idCell.textContent = attendees[nAttendee].ID;
-                        agentCell.textContent = attendees[nAttendee].Agente;
-                        lastnameCell.textContent = attendees[nAttendee]["Apellido(s)"];
-                        nameCell.textContent = attendees[nAttendee]["Nombre(s)"];
-                        companyCell.textContent = attendees[nAttendee].Empresa;
-                        typeCell.textContent = attendees[nAttendee]["Tipo de Asistente"];
-                        scholarshipCell.textContent = attendees[nAttendee].Beca;
-                        day1Cell.textContent = attendees[nAttendee]["Día 1"];
-                        day2Cell.textContent = attendees[nAttendee]["Día 2"];
-                        day3Cell.textContent = attendees[nAttendee]["Día 3"];
-                        day4Cell.textContent = attendees[nAttendee]["Día 4"];
-
-                    }
-
-                    const exGeneralRow = exhibitorGeneralTable.tBodies[0].rows[0];
-                    exGeneralRow.cells[0].textContent = stats.total_exhibitors;
-                    exGeneralRow.cells[1].textContent = stats.daily_exhibitor_stats.day_3.actual;
-                    exGeneralRow.cells[2].textContent = stats.daily_exhibitor_stats.day_4.actual;
-
-                    exhibitorsTable.querySelector("tbody").innerHTML = "";
-                    for (let nExhibitor = 0; nExhibitor < exhibitors.length; nExhibitor++) {
-                        const newRow = exhibitorsTable.tBodies[0].insertRow();
-                        const idCell = newRow.insertCell();
-                        const lastnameCell = newRow.insertCell();
-                        const nameCell = newRow.insertCell();
-                        const companyCell = newRow.insertCell();
-                        const typeCell = newRow.insertCell();
-                        const day3Cell = newRow.insertCell();
-                        const day4Cell = newRow.insertCell();
-
-                        idCell.textContent = exhibitors[nExhibitor].ID;
-                        lastnameCell.textContent = exhibitors[nExhibitor]["Apellido(s)"];
-                        nameCell.textContent = exhibitors[nExhibitor]["Nombre(s)"];
-                        companyCell.textContent = exhibitors[nExhibitor].Empresa;
-                        typeCell.textContent = exhibitors[nExhibitor].Tipo;
-                        day3Cell.textContent = exhibitors[nExhibitor]["Día 3"];
-                        day4Cell.textContent = exhibitors[nExhibitor]["Día 4"];
-
-                    }
-
-                    const spGeneralRow = speakersGeneralTable.tBodies[0].rows[0];
-                    spGeneralRow.cells[0].textContent = stats.total_speakers;
-                    spGeneralRow.cells[1].textContent = stats.daily_speaker_stats.day_1.actual;
-                    spGeneralRow.cells[2].textContent = stats.daily_speaker_stats.day_2.actual;
-                    spGeneralRow.cells[3].textContent = stats.daily_speaker_stats.day_3.actual;
-                    spGeneralRow.cells[4].textContent = stats.daily_speaker_stats.day_4.actual;
-
-                    speakersTable.querySelector("tbody").innerHTML = "";
-                    for (let nSpeaker = 0; nSpeaker < speakers.length; nSpeaker++) {
-                        const newRow = speakersTable.tBodies[0].insertRow();
-                        const idCell = newRow.insertCell();
-                        const lastnameCell = newRow.insertCell();
-                        const nameCell = newRow.insertCell();
-                        const companyCell = newRow.insertCell();
-                        const typeCell = newRow.insertCell();
-                        const day1Cell = newRow.insertCell();
-                        const day2Cell = newRow.insertCell();
-                        const day3Cell = newRow.insertCell();
-                        const day4Cell = newRow.insertCell();
-
-                        idCell.textContent = speakers[nSpeaker].ID;
-                        lastnameCell.textContent = speakers[nSpeaker]["Apellido(s)"];
-                        nameCell.textContent = speakers[nSpeaker]["Nombre(s)"];
-                        companyCell.textContent = speakers[nSpeaker].Empresa;
-                        typeCell.textContent = speakers[nSpeaker].Tipo;
-                        day1Cell.textContent = speakers[nSpeaker]["Día 1"];
-                        day2Cell.textContent = speakers[nSpeaker]["Día 2"];
-                        day3Cell.textContent = speakers[nSpeaker]["Día 3"];
-                        day4Cell.textContent = speakers[nSpeaker]["Día 4"];
-
-                    }
-
-                    const generalRow = generalTable.tBodies[0].rows[0];
-                    generalRow.cells[0].textContent = stats.total_attendees;
-                    generalRow.cells[1].textContent = stats.type_stats.combo;
-                    generalRow.cells[2].textContent = stats.type_stats.sessions;
-                    generalRow.cells[3].textContent = stats.type_stats.courses;
-                    generalRow.cells[4].textContent = stats.type_stats.general;
-                    generalRow.cells[5].textContent = stats.scholarship_stats.total_scholarship_holders;
-                    generalRow.cells[6].textContent = stats.scholarship_stats.combo_scholarship_holders;
-                    generalRow.cells[7].textContent = stats.scholarship_stats.sessions_scholarship_holders;
-                    generalRow.cells[8].textContent = stats.scholarship_stats.courses_scholarship_holders;
-                    generalRow.cells[9].textContent = stats.scholarship_stats.general_scholarship_holders;
-
-                    const generalRow1 = generalTable1.tBodies[0].rows[0];
-                    generalRow1.cells[0].textContent = stats.total_scanned_attendees;
-                    generalRow1.cells[1].textContent = stats.scanned_scholarship_holders.total;
-                    generalRow1.cells[2].textContent = stats.scanned_attendees_by_type.combo;
-                    generalRow1.cells[3].textContent = stats.scanned_attendees_by_type.sessions;
-                    generalRow1.cells[4].textContent = stats.scanned_attendees_by_type.courses;
-                    generalRow1.cells[5].textContent = stats.scanned_attendees_by_type.general;
-                    generalRow1.cells[6].textContent = stats.scanned_scholarship_holders.combo;
-                    generalRow1.cells[7].textContent = stats.scanned_scholarship_holders.sessions;
-                    generalRow1.cells[8].textContent = stats.scanned_scholarship_holders.courses;
-                    generalRow1.cells[9].textContent = stats.scanned_scholarship_holders.general;
-
-                    dailyTable.querySelector("tbody").innerHTML = "";
-
-                    for (let day = 1; day <= 4; day++) {
-                        const newRow = dailyTable.tBodies[0].insertRow();
-                        const dayCell = newRow.insertCell();
-                        const comboCell = newRow.insertCell();
-                        const coursesCell = newRow.insertCell();
-                        const sessionsCell = newRow.insertCell();
-                        const generalCell = newRow.insertCell();
-                        const eTotalCell = newRow.insertCell();
-                        const totalCell = newRow.insertCell();
-                        const scholarshipsCell = newRow.insertCell();
-
-                        dayCell.textContent = `Día ${day}`;
-                        comboCell.textContent = stats.daily_attendee_type_scans[`day_${day}`].combo;
-                        coursesCell.textContent = stats.daily_attendee_type_scans[`day_${day}`].courses;
-                        sessionsCell.textContent = stats.daily_attendee_type_scans[`day_${day}`].sessions;
-                        generalCell.textContent = stats.daily_attendee_type_scans[`day_${day}`].general;
-                        eTotalCell.textContent = stats.daily_stats[`day_${day}`].expected;
-                        totalCell.textContent = stats.daily_stats[`day_${day}`].actual.length;
-                        scholarshipsCell.textContent = stats.daily_scanned_sh[`day_${day}`];
-                    }
-                    lastStats = stats;
+                if (!isEqual(data.stats, lastStats)) {
+                    lastStats = data.stats;
+                    renderStats(lastStats);
                 }
 
-                if (!isEqual(exhibitorScansStats, lastExhibitorScansStats)) {
-                    exhibitorScansTable.querySelector("tbody").innerHTML = "";
-                    for (let nExhibitorCompany = 0; nExhibitorCompany < exhibitorScansStats.length; nExhibitorCompany++) {
-                        const newRow = exhibitorScansTable.tBodies[0].insertRow();
-                        const idCell = newRow.insertCell();
-                        const companyCell = newRow.insertCell();
-                        const contactCountCell = newRow.insertCell();
-                        const apptCountCell = newRow.insertCell();
-                        const completedApptCountCell = newRow.insertCell();
-
-                        idCell.textContent = nExhibitorCompany + 1;
-                        companyCell.textContent = exhibitorScansStats[nExhibitorCompany].company;
-                        contactCountCell.textContent = exhibitorScansStats[nExhibitorCompany].contact_count;
-                        apptCountCell.textContent = exhibitorScansStats[nExhibitorCompany].appt_count;
-                        completedApptCountCell.textContent = exhibitorScansStats[nExhibitorCompany].completed_appt_count;
-                    }
-                    lastExhibitorScansStats = exhibitorScansStats;
+                if (!isEqual(data.exhibitors_scans, lastExhibitorScansStats)) {
+                    lastExhibitorScansStats = data.exhibitors_scans;
+                    renderExhibitorScans(lastExhibitorScansStats);
                 }
             }
         });
 }
 
-setInterval(updateData, 60000 * 15);
+function applyExhibitorScanDeltas(deltas) {
+    const rowsByCompany = {};
+    lastExhibitorScansStats.forEach(row => {
+        rowsByCompany[String(row.company).toUpperCase()] = row;
+    });
+
+    let changed = false;
+    deltas.forEach(delta => {
+        const row = rowsByCompany[delta.company];
+        if (!row) return;
+        row.contact_count += delta.contact_count || 0;
+        row.appt_count += delta.appt_count || 0;
+        row.completed_appt_count += delta.completed_appt_count || 0;
+        changed = true;
+    });
+    return changed;
+}
+
+function handleStatsUpdate(update) {
+    if (!update || update.event_id !== statsEventId) return;
+
+    const sections = update.stats || {};
+    if (update.reload || "exhibitor_companies" in sections) {
+        // Cambió la lista de empresas o el documento completo: se recarga todo una vez
+        scheduleStatsReload();
+        return;
+    }
+
+    if (Object.keys(sections).length) {
+        lastStats = { ...lastStats, ...sections };
+        renderStats(lastStats);
+    }
+
+    if (Array.isArray(lastExhibitorScansStats) && applyExhibitorScanDeltas(update.exhibitors_scans || [])) {
+        renderExhibitorScans(lastExhibitorScansStats);
+    }
+}
+
+function scheduleStatsReload() {
+    clearTimeout(statsReloadTimer);
+    statsReloadTimer = setTimeout(updateData, STATS_RELOAD_DEBOUNCE_MS);
+}
+
+// Los cambios llegan por socket; el sondeo es la red de seguridad si se pierde
+// un aviso o la conexión
+function joinStatsRoom(selection) {
+    statsEventId = null;
+    if (statsSocket && statsSocket.connected) {
+        statsSocket.emit("join_stats", { stats_id: selection }, (response) => {
+            if (statsSelector.value === selection) {
+                statsEventId = response ? response.event_id : null;
+            }
+        });
+    }
+}
+
+if (typeof io !== "undefined") {
+    statsSocket = io({ transports: ["websocket"] });
+    statsSocket.on("stats_update", handleStatsUpdate);
+    statsSocket.on("connect", () => {
+        if (statsSelector.value) updateData();
+    });
+}
+
+setInterval(updateData, STATS_FALLBACK_POLL_MS);
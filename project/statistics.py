@@ -0,0 +1,494 @@
+from dataclasses import dataclass
+from datetime import datetime
+from numbers import Number
+from typing import Any
+
+from sqlalchemy import Numeric, String, Text, cast, column, func, literal, select
+from sqlalchemy import text, true, update
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from .caching import bump_data_version
+from .models import (
+    Appointment,
+    DataVersion,
+    Event,
+    ExhibitorRollup,
+    ExhibitorScan,
+    Stats,
+    User,
+)
+from . import db
+
+STATS_NOTIFY_CHANNEL = "stats_changed"
+# Las escrituras que ya publican sus secciones marcan la transacción para que
+# el trigger no avise otra vez
+STATS_PUBLISHED_SETTING = "app.stats_published"
+
+STATS_NOTIFY_TRIGGER_SQL = f"""
+CREATE OR REPLACE FUNCTION notify_stats_changed() RETURNS trigger AS $$
+BEGIN
+    IF coalesce(current_setting('{STATS_PUBLISHED_SETTING}', true), '') <> 'on' THEN
+        PERFORM pg_notify('{STATS_NOTIFY_CHANNEL}', NEW.event_id::text);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS statistics_notify_changed ON statistics;
+CREATE TRIGGER statistics_notify_changed
+    AFTER INSERT OR UPDATE OF stats ON statistics
+    FOR EACH ROW EXECUTE FUNCTION notify_stats_changed();
+"""
+
+STATS_PATCH_MAX_OPERATIONS = 500
+STATS_PATCH_OPERATIONS = ("set", "merge", "increment", "append")
+# Tipo jsonb que debe tener el valor actual; si no existe se crea
+STATS_PATCH_TARGET_TYPES = {"merge": "object", "append": "array", "increment": "number"}
+JSONB_TYPE_LABELS = {"object": "un objeto", "array": "una lista", "number": "un número"}
+
+# Secciones del documento que muestra la página de estadísticas. De daily_stats
+# sólo se necesita el conteo de cada lista "actual"
+STATISTICS_PAGE_SECTIONS = (
+    "attendees_scan_stats",
+    "exhibitor_scan_stats",
+    "speakers_scan_stats",
+    "total_attendees",
+    "total_exhibitors",
+    "total_speakers",
+    "total_scanned_attendees",
+    "type_stats",
+    "scholarship_stats",
+    "scanned_attendees_by_type",
+    "scanned_scholarship_holders",
+    "daily_attendee_type_scans",
+    "daily_scanned_sh",
+    "daily_exhibitor_stats",
+    "daily_speaker_stats",
+    "daily_stats",
+)
+
+
+@dataclass(frozen=True)
+class DailyStatsSummary:
+    total: int
+    attendee_types: dict
+    scholarships: int
+    exhibitors: Any
+    speakers: int
+    updated_at: Any
+
+    @classmethod
+    def from_row(cls, row):
+        total, attendee_types, scholarships, exhibitors, speakers, updated_at = row
+        return cls(
+            total=total,
+            attendee_types=attendee_types or {},
+            scholarships=scholarships if scholarships is not None else 0,
+            exhibitors=exhibitors if exhibitors is not None else "---",
+            speakers=speakers if speakers is not None else 0,
+            updated_at=updated_at,
+        )
+
+
+def stats_value(*path: str):
+    # Extrae el valor en Postgres (-> / #>) sin traer el documento completo
+    return Stats.stats[path if len(path) > 1 else path[0]]
+
+
+def _array_length(value):
+    return func.coalesce(
+        func.jsonb_array_length(func.coalesce(value, text("'[]'::jsonb"))), 0
+    )
+
+
+def daily_stats_counts():
+    days = (
+        func.jsonb_each(stats_value("daily_stats"))
+        .table_valued(column("key", String), column("value", JSONB))
+        .alias("daily_stats_day")
+    )
+    return (
+        select(
+            func.jsonb_object_agg(
+                days.c.key,
+                func.jsonb_build_object(
+                    "expected",
+                    days.c.value["expected"],
+                    "actual_count",
+                    _array_length(days.c.value["actual"]),
+                ),
+            )
+        )
+        .select_from(days)
+        .scalar_subquery()
+    )
+
+
+def daily_summary_columns(day_key: str):
+    return [
+        _array_length(stats_value("daily_stats", day_key, "actual")),
+        stats_value("daily_attendee_type_scans", day_key),
+        stats_value("daily_scanned_sh", day_key),
+        stats_value("daily_exhibitor_stats", day_key, "actual"),
+        stats_value("daily_speaker_stats", day_key, "actual"),
+        Stats.updated_at,
+    ]
+
+
+def _section_value(section: str):
+    if section == "daily_stats":
+        return daily_stats_counts()
+    return stats_value(section)
+
+
+def get_stats_sections(sections=STATISTICS_PAGE_SECTIONS, stats_id=None, event_id=None):
+    stmt = select(
+        Stats.event_id, *(_section_value(section) for section in sections)
+    ).where(Stats.stats.isnot(None))
+    if stats_id is not None:
+        stmt = stmt.where(Stats.stats_id == stats_id)
+    else:
+        stmt = stmt.where(Stats.event_id == event_id)
+
+    row = db.session.execute(stmt).first()
+    if row is None:
+        return None, {}
+
+    event_id, *values = row
+    stats = dict(zip(sections, values))
+    if "daily_stats" in stats:
+        stats["daily_stats"] = stats["daily_stats"] or {}
+    return event_id, stats
+
+
+def get_exhibitor_companies(event_id: int):
+    return (
+        db.session.execute(
+            select(stats_value("exhibitor_companies")).where(Stats.event_id == event_id)
+        ).scalar()
+        or []
+    )
+
+
+def get_exhibitor_companies_by_event():
+    return [
+        (f"{location} {year}", companies or [])
+        for companies, location, year in db.session.execute(
+            select(stats_value("exhibitor_companies"), Event.location, Event.year).join(
+                Event, Event.event_id == Stats.event_id
+            )
+        )
+    ]
+
+
+def get_company_reps(event_id: int, company: str):
+    # Filtra las filas de exhibitor_scan_stats en Postgres y sólo regresa nombres
+    rows = (
+        func.jsonb_array_elements(
+            func.coalesce(stats_value("exhibitor_scan_stats"), text("'[]'::jsonb"))
+        )
+        .table_valued(column("value", JSONB))
+        .lateral("exhibitor_row")
+    )
+    name = func.trim(
+        func.concat(
+            func.trim(func.coalesce(rows.c.value["Nombre(s)"].astext, "")),
+            " ",
+            func.trim(func.coalesce(rows.c.value["Apellido(s)"].astext, "")),
+        )
+    )
+    stmt = (
+        select(name)
+        .distinct()
+        .select_from(Stats)
+        .join(rows, true())
+        .where(
+            Stats.event_id == event_id,
+            func.upper(func.trim(func.coalesce(rows.c.value["Empresa"].astext, "")))
+            == (company or "").strip().upper(),
+        )
+    )
+    return sorted(db.session.execute(stmt).scalars())
+
+
+def stats_section_scope(event_id: int, section: str):
+    return f"stats|{event_id}|{section}"
+
+
+def get_stats_section_versions(event_id: int):
+    prefix = stats_section_scope(event_id, "")
+    return {
+        scope[len(prefix) :]: version
+        for scope, version in db.session.execute(
+            select(DataVersion.scope, DataVersion.version).where(
+                DataVersion.scope.startswith(prefix, autoescape=True)
+            )
+        )
+    }
+
+
+def _parse_patch_operation(raw):
+    if not isinstance(raw, dict) or raw.get("op") not in STATS_PATCH_OPERATIONS:
+        raise ValueError("Operación inválida")
+    path = raw.get("path")
+    if (
+        not isinstance(path, list)
+        or not path
+        or not all(isinstance(key, (str, int)) and str(key) for key in path)
+    ):
+        raise ValueError("Ruta inválida")
+    path = tuple(str(key) for key in path)
+
+    op = raw["op"]
+    if op == "increment":
+        value = raw.get("by", 1)
+        if not isinstance(value, Number) or isinstance(value, bool):
+            raise ValueError(f"Incremento inválido en {'.'.join(path)}")
+    elif op == "append":
+        value = raw.get("values")
+        if not isinstance(value, list):
+            raise ValueError(f"Se esperaba una lista en {'.'.join(path)}")
+    elif op == "merge":
+        value = raw.get("value")
+        if not isinstance(value, dict):
+            raise ValueError(f"Se esperaba un objeto en {'.'.join(path)}")
+    else:
+        if "value" not in raw:
+            raise ValueError(f"Falta el valor en {'.'.join(path)}")
+        value = raw["value"]
+    return op, path, value
+
+
+def parse_stats_patch(operations):
+    if not isinstance(operations, list) or not operations:
+        raise ValueError("Se esperaba una lista de operaciones")
+    if len(operations) > STATS_PATCH_MAX_OPERATIONS:
+        raise ValueError(
+            f"Máximo {STATS_PATCH_MAX_OPERATIONS} operaciones por solicitud"
+        )
+
+    # Las operaciones repetidas sobre la misma ruta se combinan; cada valor
+    # nuevo se calcula sobre el documento original, así que las rutas no
+    # pueden contenerse entre sí
+    combined = {}
+    for raw in operations:
+        op, path, value = _parse_patch_operation(raw)
+        if path not in combined:
+            combined[path] = (op, value)
+            continue
+        previous_op, previous_value = combined[path]
+        if op != previous_op or op == "set":
+            raise ValueError(f"Operaciones en conflicto en {'.'.join(path)}")
+        if op == "increment":
+            combined[path] = (op, previous_value + value)
+        elif op == "append":
+            combined[path] = (op, previous_value + value)
+        else:
+            combined[path] = (op, {**previous_value, **value})
+
+    paths = sorted(combined, key=len)
+    for i, path in enumerate(paths):
+        for other in paths[i + 1 :]:
+            if other[: len(path)] == path:
+                raise ValueError(
+                    f"Operaciones en conflicto en {'.'.join(path)} y {'.'.join(other)}"
+                )
+    return [(op, path, value) for path, (op, value) in combined.items()]
+
+
+def _path_param(path):
+    return literal(list(path), ARRAY(Text))
+
+
+def _is_array_index(key: str):
+    return key.lstrip("-").isdigit()
+
+
+def _check_patch_targets(event_id: int, operations):
+    # jsonb_set no falla ante un tipo distinto: `||` mete el objeto dentro de
+    # una lista y un índice inexistente se agrega al final. Se valida con la
+    # fila bloqueada antes del UPDATE
+    prefixes = sorted(
+        {path[:depth] for _, path, _ in operations for depth in range(1, len(path) + 1)}
+    )
+    types = dict(
+        zip(
+            prefixes,
+            db.session.execute(
+                select(
+                    *(
+                        func.jsonb_typeof(
+                            Stats.stats.op("#>", return_type=JSONB)(_path_param(prefix))
+                        )
+                        for prefix in prefixes
+                    )
+                )
+                .where(Stats.event_id == event_id)
+                .with_for_update()
+            ).one(),
+        )
+    )
+
+    for op, path, _ in operations:
+        label = ".".join(path)
+        for depth, key in enumerate(path):
+            parent_type = types[path[:depth]] if depth else "object"
+            if parent_type == "array":
+                if not _is_array_index(key) or types[path[: depth + 1]] is None:
+                    raise ValueError(f"No existe la posición {key} en {label}")
+            elif parent_type not in (None, "object"):
+                raise ValueError(
+                    f"{'.'.join(path[:depth])} no es un objeto ni una lista"
+                )
+        expected = STATS_PATCH_TARGET_TYPES.get(op)
+        if expected and types[path] not in (None, expected):
+            raise ValueError(f"Se esperaba {JSONB_TYPE_LABELS[expected]} en {label}")
+
+
+def _patched_value(op, path, value):
+    current = Stats.stats.op("#>", return_type=JSONB)(_path_param(path))
+    if op == "set":
+        return literal(value, JSONB)
+    if op == "merge":
+        return func.coalesce(current, text("'{}'::jsonb")).op("||", return_type=JSONB)(
+            literal(value, JSONB)
+        )
+    if op == "append":
+        return func.coalesce(current, text("'[]'::jsonb")).op("||", return_type=JSONB)(
+            literal(value, JSONB)
+        )
+    as_number = cast(
+        Stats.stats.op("#>>", return_type=Text)(_path_param(path)), Numeric
+    )
+    return func.to_jsonb(func.coalesce(as_number, 0) + value)
+
+
+def apply_stats_patch(event_id: int, operations):
+    # Aplica todas las operaciones en un solo UPDATE; el pipeline ya no
+    # necesita reenviar el documento completo
+    db.session.execute(select(func.set_config(STATS_PUBLISHED_SETTING, "on", True)))
+    db.session.execute(
+        pg_insert(Stats)
+        .values(event_id=event_id, stats={})
+        .on_conflict_do_nothing(index_elements=[Stats.event_id])
+    )
+    _check_patch_targets(event_id, operations)
+
+    document = func.coalesce(Stats.stats, text("'{}'::jsonb"))
+    # jsonb_set sólo crea la última llave de la ruta: primero se aseguran los
+    # objetos intermedios, de los menos a los más profundos
+    parents = sorted(
+        {path[:depth] for _, path, _ in operations for depth in range(1, len(path))},
+        key=len,
+    )
+    for parent in parents:
+        document = func.jsonb_set(
+            document,
+            _path_param(parent),
+            func.coalesce(
+                Stats.stats.op("#>", return_type=JSONB)(_path_param(parent)),
+                text("'{}'::jsonb"),
+            ),
+            True,
+            type_=JSONB,
+        )
+    for op, path, value in operations:
+        document = func.jsonb_set(
+            document,
+            _path_param(path),
+            _patched_value(op, path, value),
+            True,
+            type_=JSONB,
+        )
+
+    db.session.execute(
+        update(Stats)
+        .where(Stats.event_id == event_id)
+        .values(stats=document, updated_at=datetime.utcnow())
+    )
+    return {
+        section: bump_data_version(stats_section_scope(event_id, section))
+        for section in sorted({path[0] for _, path, _ in operations})
+    }
+
+
+def bump_exhibitor_rollup(event_id, company, contacts=0, appointments=0, completed=0):
+    # Se ejecuta dentro de la transacción del escaneo o de la cita
+    if not event_id or not company or not (contacts or appointments or completed):
+        return
+    stmt = pg_insert(ExhibitorRollup).values(
+        event_id=event_id,
+        company=func.upper(company),
+        contact_count=contacts,
+        appt_count=appointments,
+        completed_appt_count=completed,
+    )
+    db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[ExhibitorRollup.event_id, ExhibitorRollup.company],
+            set_={
+                "contact_count": ExhibitorRollup.contact_count
+                + stmt.excluded.contact_count,
+                "appt_count": ExhibitorRollup.appt_count + stmt.excluded.appt_count,
+                "completed_appt_count": ExhibitorRollup.completed_appt_count
+                + stmt.excluded.completed_appt_count,
+            },
+        )
+    )
+
+
+def rebuild_exhibitor_rollups(event_ids=None):
+    company = func.upper(User.company)
+    totals = (
+        select(
+            ExhibitorScan.event_id,
+            company,
+            func.count(ExhibitorScan.e_scan_id.distinct()),
+            func.count(Appointment.e_scan_id),
+            func.count(Appointment.e_scan_id).filter(Appointment.status.is_(True)),
+        )
+        .join(User, User.user_id == ExhibitorScan.user_id)
+        .outerjoin(Appointment, Appointment.e_scan_id == ExhibitorScan.e_scan_id)
+        .where(User.company.isnot(None))
+        .group_by(ExhibitorScan.event_id, company)
+    )
+    delete = db.delete(ExhibitorRollup)
+    if event_ids is not None:
+        event_ids = list(event_ids)
+        if not event_ids:
+            return 0
+        totals = totals.where(ExhibitorScan.event_id.in_(event_ids))
+        delete = delete.where(ExhibitorRollup.event_id.in_(event_ids))
+
+    db.session.execute(delete)
+    return db.session.execute(
+        db.insert(ExhibitorRollup).from_select(
+            [
+                "event_id",
+                "company",
+                "contact_count",
+                "appt_count",
+                "completed_appt_count",
+            ],
+            totals,
+        )
+    ).rowcount
+
+
+def get_exhibitor_rollups(event_id: int):
+    return {
+        company: {
+            "contact_count": contact_count,
+            "appt_count": appt_count,
+            "completed_appt_count": completed_appt_count,
+        }
+        for company, contact_count, appt_count, completed_appt_count in db.session.execute(
+            select(
+                ExhibitorRollup.company,
+                ExhibitorRollup.contact_count,
+                ExhibitorRollup.appt_count,
+                ExhibitorRollup.completed_appt_count,
+            ).where(ExhibitorRollup.event_id == event_id)
+        )
+    }
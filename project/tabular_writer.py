@@ -0,0 +1,59 @@
+import csv
+import io
+import tempfile
+from itertools import islice
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+PARQUET_BATCH_SIZE = 5000
+
+
+def _as_text(value):
+    return None if value is None else str(value)
+
+
+def iter_records_csv(data, columns):
+    # Genera el CSV línea por línea para enviarlo como respuesta en streaming.
+    # El BOM hace que Excel lo abra como UTF-8
+    yield "\ufeff"
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    for record in data:
+        writer.writerow(record)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def create_records_csv_file(data, columns, output):
+    with open(output, "w", encoding="utf-8", newline="") as fh:
+        for chunk in iter_records_csv(data, columns):
+            fh.write(chunk)
+    return output
+
+
+def create_records_parquet_file(data, columns, output=None):
+    if output is None:
+        output = tempfile.TemporaryFile()
+
+    # Todas las columnas se exportan como texto, igual que en el Excel
+    schema = pa.schema([(column, pa.string()) for column in columns])
+    records = iter(data)
+    with pq.ParquetWriter(output, schema, compression="zstd") as writer:
+        while True:
+            batch = list(islice(records, PARQUET_BATCH_SIZE))
+            if not batch:
+                break
+            rows = [
+                {column: _as_text(record.get(column)) for column in columns}
+                for record in batch
+            ]
+            writer.write_batch(pa.RecordBatch.from_pylist(rows, schema=schema))
+
+    if hasattr(output, "seek"):
+        output.seek(0)
+    return output